@@ -1,10 +1,14 @@
 """
 This file automatically filters out duplicates, github.io repositories and forks.
 """
+import sys
 from datetime import datetime
+from pathlib import Path
 import argparse
 
-import pandas as pd
+# make the shared modules in the project root importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from swords.storage import read_table, write_table  # pylint: disable=wrong-import-position
 
 # Initiate the parser
 parser = argparse.ArgumentParser()
@@ -20,26 +24,10 @@ parser.add_argument("--output",
                     default="results/repositories_filtered.csv")
 
 
-def read_input_file(file_path):
-    """reads in the input file through Pandas
-
-    Args:
-        file_path (string): path to the file
-
-    Returns:
-        DataFrame
-    """
-    if "xlsx" in file_path:
-        file = pd.read_excel(file_path, engine='openpyxl')
-    else:
-        file = pd.read_csv(file_path)
-    return file
-
-
 # Read arguments from the command line
 args = parser.parse_args()
 print(f"Filtering repositories for the following file: {args.input}")
-df_repos = read_input_file(args.input)
+df_repos = read_table(args.input)
 
 num_total = len(df_repos.index)
 
@@ -68,10 +56,7 @@ print(f"Filtered {num_filtered} of {num_total} repositories. {num_final}"
 current_date = datetime.today().strftime('%Y-%m-%d')
 df_repos_filtered = df_repos_filtered.assign(date=current_date)
 
-if "xlsx" in args.output:
-    df_repos_filtered.to_excel(args.output, index=False)
-else:
-    df_repos_filtered.to_csv(args.output, index=False)
+write_table(df_repos_filtered, args.output)
 
 print(
     f"Successfully filtered user repositories. Saved result to {args.output}.")
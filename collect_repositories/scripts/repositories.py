@@ -2,15 +2,23 @@
 This file retrieves repositories from a file of users.
 """
 import os
-import time
+import sys
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from pathlib import Path
 
-from ghapi.all import GhApi, pages
-from fastcore.foundation import L, AttrDict
+from ghapi.all import GhApi
+from fastcore.foundation import L
 import pandas as pd
 from dotenv import load_dotenv
 
+# make the shared modules in the project root importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from swords.github_client import GitHubClient  # pylint: disable=wrong-import-position
+from swords.ratelimit import RateLimiter  # pylint: disable=wrong-import-position
+from swords.storage import read_table, write_table  # pylint: disable=wrong-import-position
+
 
 class Service:
     """
@@ -44,49 +52,85 @@ def get_repos(user_id, service):
         )
         print(e)
         return None
-    result = L()
+    result = L(query_result)
+    # the first page is reused, only the remaining pages are requested.
+    # The last page is read from the headers of the first response of this thread
     num_pages = service.api.last_page()
-    if num_pages > 0:
-        query_result = pages(
-            service.api.repos.list_for_user, num_pages, user_id)
-        for page in query_result[0]:
-            result.append(page)
-        time.sleep(service.sleep)
-    else:
-        result.extend(query_result)
+    for page in range(2, num_pages + 1):
+        result.extend(service.api.repos.list_for_user(user_id, per_page=100, page=page))
     return result
 
 
-def get_repos_formatted(repos_unformatted):
-    """Goes through a list of repos and returns them correctly formatted
+def get_users_repos(user_ids, service, workers=1):
+    """retrieves the repositories of several users. Up to `workers` users are
+    requested concurrently. All workers share the rate limiter of the service.
 
     Args:
-        repos (L): fastcore foundation list of repositories
+        user_ids (list): user ids which are named as "login" from the GitHub Api
+        service (Service): Service object with API connection and metadata vars
+        workers (int): number of users that are processed concurrently
 
     Returns:
-        L: fastcore founation list of complete repository data
+        list: repositories of all users in the order of the input
     """
-    result = L()
-    for repo in repos_unformatted:
-        repo_dict = dict(repo)
-        result.append(repo_dict)
-    return result
-
-
-def read_input_file(file_path):
-    """reads in the input file through Pandas
+    result_repos = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        user_repos = executor.map(lambda user_id: get_repos(user_id, service), user_ids)
+        for counter, (user, repos) in enumerate(zip(user_ids, user_repos)):
+            if repos is not None:
+                result_repos.extend(repos)
+            else:
+                print(f"User {user} has no repositories.")
+            if counter % 10 == 0:
+                print(f"Processed {counter} out of {len(user_ids)} users.")
+    return result_repos
+
+
+# nested fields of the repositories that are flattened to one of their values
+NESTED_FIELDS = {"owner": "login", "license": "name"}
+# nested fields of the repositories that are left empty
+EMPTIED_FIELDS = ["permissions"]
+# types of the repository columns. Nullable types are used, as values can be missing
+REPOSITORY_SCHEMA = {
+    "id": "Int64",
+    "size": "Int64",
+    "stargazers_count": "Int64",
+    "watchers_count": "Int64",
+    "forks_count": "Int64",
+    "open_issues_count": "Int64",
+    "forks": "Int64",
+    "open_issues": "Int64",
+    "watchers": "Int64",
+    "private": "boolean",
+    "fork": "boolean",
+    "archived": "boolean",
+    "disabled": "boolean",
+}
+
+
+def get_repos_dataframe(repos):
+    """Builds a DataFrame with one column per repository field, flattening the
+    nested fields column by column, see NESTED_FIELDS and EMPTIED_FIELDS.
 
     Args:
-        file_path (string): path to the file
+        repos (list): repositories as retrieved from the GitHub API
 
     Returns:
-        DataFrame
+        DataFrame: repositories with flat and typed columns
     """
-    if "xlsx" in file_path:
-        file = pd.read_excel(file_path, engine='openpyxl')
-    else:
-        file = pd.read_csv(file_path)
-    return file
+    df_repos = pd.DataFrame.from_records(repos)
+    for field, value_key in NESTED_FIELDS.items():
+        if field in df_repos.columns:
+            df_repos[field] = df_repos[field].str.get(value_key)
+    for field in EMPTIED_FIELDS:
+        if field in df_repos.columns:
+            df_repos.loc[df_repos[field].notna(), field] = ""
+    if "topics" in df_repos.columns:
+        # stored as text, so every file format keeps the same representation
+        df_repos["topics"] = df_repos["topics"].map(lambda topics: str(list(topics)),
+                                                      na_action="ignore")
+    return df_repos.astype({column: dtype for column, dtype in REPOSITORY_SCHEMA.items()
+                            if column in df_repos.columns})
 
 
 if __name__ == '__main__':
@@ -104,6 +148,18 @@ if __name__ == '__main__':
         "-o",
         help="The file name of the repositories that are retrieved.",
         default="results/repositories.csv")
+    parser.add_argument(
+        "--cache",
+        help="Optional. Directory for a persistent cache of GitHub API responses."
+        " Cached responses are revalidated with conditional requests.")
+
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        help="Optional. Number of users whose repositories are requested concurrently."
+        " All workers share one rate limit budget.",
+        default=1)
 
     # Read arguments from the command line
     args = parser.parse_args()
@@ -113,45 +169,19 @@ if __name__ == '__main__':
     # if unauthorized API is used, rate limit is lower,
     # leading to a ban and waiting time needs to be increased
     token = os.getenv('GITHUB_TOKEN')
-    serv = Service(api=GhApi(token=token), sleep=2)
-    df_users = read_input_file(args.users)
+    serv = Service(api=GitHubClient(token=token, cache_dir=args.cache, limiter=RateLimiter()))
+    df_users = read_table(args.users, columns=["user_id", "final_decision"])
 
     # drop filtered users
     df_users = df_users.drop(df_users[df_users.final_decision == 0].index)
 
-    result_repos = []
-    COUNTER = 0
-    for user in df_users["user_id"]:
-        repos = get_repos(user, serv)
-        if repos is not None:
-            repos_formatted = get_repos_formatted(repos)
-            result_repos.extend(repos_formatted)
-        else:
-            print(f"User {user} has no repositories.")
-        time.sleep(2.1)
-        if COUNTER % 10 == 0:
-            print(f"Processed {COUNTER} out of {len(df_users.index)} users.")
-        COUNTER += 1
+    repositories = get_users_repos(list(df_users["user_id"]), serv, args.workers)
 
     print("Finished processing users. Flattening nested structures...")
-    # Flatten nested structures
-    for result_repo in result_repos:
-        for key in result_repo.keys():
-            if isinstance(result_repo[key], AttrDict):
-                if key == "owner":
-                    result_repo[key] = result_repo[key]["login"]
-                elif key == "permissions":
-                    result_repo[key] = ""
-                elif key == "license":
-                    result_repo[key] = result_repo[key]["name"]
-
-    df_result_repos = pd.DataFrame(result_repos)
+    df_result_repos = get_repos_dataframe(repositories)
     df_result_repos["date"] = serv.current_date
 
-    if "xlsx" in args.output:
-        df_result_repos.to_excel(args.output, index=False)
-    else:
-        df_result_repos.to_csv(args.output, index=False)
+    write_table(df_result_repos, args.output)
     print(
         f"Successfully retrieved user repositories. Saved result to {args.output}."
     )
@@ -1,14 +1,56 @@
 """
 This file retrieves Github usernames from the API of Utrecht University employee pages
 """
-import time
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+
+# make the shared modules in the project root importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from swords.handles import find_github_handles  # pylint: disable=wrong-import-position
+from swords.ratelimit import RateLimiter  # pylint: disable=wrong-import-position
+from swords.retry import RetryPolicy  # pylint: disable=wrong-import-position
 
 REST_API_URL = "https://www.uu.nl/medewerkers/RestApi/Public"
+# the employee API has no rate limit headers, requests are paced at one per second
+# by default, without bursts. The pace can be changed with --interval
+limiter = RateLimiter(min_interval=1, burst=0)
+# connections to the employee API are kept open and reused by all workers
+session = requests.Session()
+REQUEST_TIMEOUT = 30
+# server errors and network errors of the faculty pages are retried, so a faculty
+# is only considered missing if the API confirms that it does not exist
+retry_policy = RetryPolicy()
+
+
+def get_json(request_url):
+    """Requests a page of the employee API, paced by the shared rate limiter
+
+    Args:
+        request_url (string): url of the page
+
+    Returns:
+        dict: the JSON response, None if the page does not exist (404) or is not JSON
+
+    Raises:
+        requests.RequestException: for other error responses and network errors
+    """
+    limiter.acquire()
+    response = session.get(request_url, timeout=REQUEST_TIMEOUT)
+    limiter.update(response.headers)  # honours Retry-After
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    try:
+        return response.json()
+    except ValueError:
+        return None
 
 
 def get_employees_url(faculty_number):
@@ -18,54 +60,53 @@ def get_employees_url(faculty_number):
         faculty_number (integer): Faculty number
 
     Returns:
-        Series: Employee URLs retrieved from faculty
+        Series: Employee URLs retrieved from faculty, None if the faculty does not exist
+
+    Raises:
+        requests.RequestException: if the faculty could not be retrieved, see retry_policy
     """
     request_url = f"{REST_API_URL}/GetEmployeesOrganogram?f={faculty_number}&l=EN&fullresult=true"
-    json_nested = requests.get(request_url)
-    df_employees = pd.DataFrame(json_nested.json()["Employees"])
-    try:
-        return df_employees["Url"]
-    except Exception as ex: # pylint: disable=broad-except
-        print(f"There was an error: {ex}")
+    json_nested = retry_policy.call(get_json, request_url)
+    # faculties that do not exist have no employees
+    if not json_nested or not json_nested.get("Employees"):
         return None
+    df_employees = pd.DataFrame(json_nested["Employees"])
+    if "Url" not in df_employees.columns:
+        return None
+    return df_employees["Url"]
 
 
-
-def parse_string_list_for_github_name(words):
-    """Gathers all github names from a list of strings
+def get_faculty_employees(max_faculty=99, max_missing=10):
+    """Collects the employee URLs of all faculties. Faculty numbers are probed in
+    ascending order, and probing stops after max_missing consecutive numbers that
+    are not a faculty. Failed requests are retried and raised if they keep failing,
+    so they do not count as missing faculties.
 
     Args:
-        words (list): a list of strings.
-        Example: ["<p>I'm", 'a', 'community', 'organizer', 'and', 'research', 'engineer']
+        max_faculty (integer): faculty numbers below this number are probed
+        max_missing (integer): number of consecutive missing faculties after which
+                               probing stops
 
     Returns:
-        List: GitHub names
+        list: Employee URLs of all faculties, without duplicates
     """
-    matches = []
-    for word in words:
-        if "github.com" in word:
-            split = word.split("github.com/")
-            # get value after "github.com/" and split after the next
-            # slash, then the first value of that split will be the
-            # username
-            user = split[1].split("/")[0]
-            # sometimes, there is still some tokens after the username
-            # due to the href format of the links. This is migated by
-            # splitting on a " and using the first word
-            user = user.split('"')[0]
-            matches.append(user)
-        elif "github.io" in word:
-            githubio_split = word.split(".")
-            try:
-                user = githubio_split[0].split("://")[1]
-            except Exception: # pylint: disable=broad-except
-                user = githubio_split[0]
-            # sometimes, there is still some tokens after the username
-            # due to the href format of the links. This is migated by
-            # splitting on a " and using the first word
-            user = user.split('"')[0]
-            matches.append(user)
-    return matches
+    employee_urls = []
+    missing = 0
+    for faculty_number in range(max_faculty):
+        faculty_employee_urls = get_employees_url(faculty_number)
+        if faculty_employee_urls is None:
+            missing += 1
+            if missing >= max_missing:
+                print(f"No faculty found for the last {missing} numbers, stopping at"
+                      f" faculty number {faculty_number}.")
+                break
+            continue
+        missing = 0
+        print(f"Parsing faculty number {faculty_number} with"
+              f" {len(faculty_employee_urls)} employees")
+        employee_urls.extend(faculty_employee_urls)
+    # employees that work for several faculties are crawled once
+    return list(dict.fromkeys(employee_urls))
 
 
 def parse_urls_for_github_name(employee_urls):
@@ -78,25 +119,8 @@ def parse_urls_for_github_name(employee_urls):
     Returns:
         List: GitHub names
     """
-    matches = []
-    for link_dict in employee_urls:
-        link = link_dict["Url"]
-        if link:
-            if "github.com" in link:
-                split = link.split("github.com/")
-                # get value after "github.com/" and split after the
-                # next slash, then the first value of that split will
-                # be the username
-                user = split[1].split("/")[0]
-                matches.append(user)
-            elif "github.io" in link:
-                githubio_split = link.split(".")
-                try:
-                    user = githubio_split[0].split("://")[1]
-                except Exception: # pylint: disable=broad-except
-                    user = githubio_split[0]
-                matches.append(user)
-    return matches
+    return find_github_handles(" ".join(link_dict["Url"] for link_dict in employee_urls
+                                        if link_dict["Url"]))
 
 
 def get_all_employee_github_usernames(user_id):
@@ -108,27 +132,23 @@ def get_all_employee_github_usernames(user_id):
     Returns:
         List: Github links
     """
-    time.sleep(1)
     try:
-        api_link = requests.get(f"{REST_API_URL}/getEmployeeData?page={user_id}")
-        api_json = api_link.json()
+        api_json = get_json(f"{REST_API_URL}/getEmployeeData?page={user_id}")
+        if not api_json or not api_json.get("Employee"):
+            return None
         git_link_list = []
         #try to retrieve from CV text
         if "CV" in api_json["Employee"].keys() and api_json["Employee"]["CV"]:
-            employee_profile = api_json["Employee"]['CV']
-            split_employee_profile = employee_profile.split()
-            github_names = parse_string_list_for_github_name(split_employee_profile)
+            github_names = find_github_handles(api_json["Employee"]['CV'])
             if github_names:
                 git_link_list.extend(github_names)
 
         if "Profile" in api_json["Employee"].keys() and api_json["Employee"]["Profile"]:
-            employee_profile = api_json["Employee"]['Profile']
-            split_employee_profile = employee_profile.split()
-            github_names = parse_string_list_for_github_name(split_employee_profile)
+            github_names = find_github_handles(api_json["Employee"]['Profile'])
             if github_names:
                 git_link_list.extend(github_names)
 
-        if "Links" in api_json["Employee"].keys() and api_json["Employee"]['LinksSocialMedia']:
+        if api_json["Employee"].get('LinksSocialMedia'):
             links_social_media = api_json["Employee"]['LinksSocialMedia']
             github_names = parse_urls_for_github_name(links_social_media)
             if github_names:
@@ -144,38 +164,48 @@ def get_all_employee_github_usernames(user_id):
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers",
+                        "-w",
+                        type=int,
+                        help="Optional. Number of employee pages that are requested concurrently."
+                        " All workers share the pace of --interval.",
+                        default=4)
+    parser.add_argument("--interval",
+                        type=float,
+                        help="Optional. Minimum number of seconds between two requests.",
+                        default=1)
+    parser.add_argument("--max_missing",
+                        type=int,
+                        help="Optional. Faculty numbers are probed until this many consecutive"
+                        " numbers are not a faculty.",
+                        default=10)
+    args = parser.parse_args()
+
+    limiter.min_interval = args.interval
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=args.workers))
+
     COUNTER = 0
     employee_github = []
     SERVICE = "github.com"
     current_date = datetime.today().strftime('%Y-%m-%d')
 
-    faculty_ids = []
-    print(
-        "Looping through faculties...",
-        "Note: Getting errors here is expected. This will take a while.",
-        "You can keep cancelling via ctrl + c until you see continuous errors."
-    )
-    for i in range(99):
-        try:
-            faculty_employee_ids = list(get_employees_url(i))
-            print(f"Parsing faculty number {i}")
-            try:
-                for employee_id in faculty_employee_ids:
-                    github_user_names = get_all_employee_github_usernames(employee_id)
-                    if github_user_names:
-                        for github_user_name in github_user_names:
-                            COUNTER += 1
-                            print(f"Found user: '{github_user_name}'. \
-                                  Employee ID: '{employee_id}'. Total: {COUNTER}")
-                            employee_github.append(
-                                [SERVICE, current_date, github_user_name, employee_id])
-            except Exception as e: # pylint: disable=broad-except
-                print(f"couldn't loop through urls. Error: {e}")
-                continue
-        except Exception as e: # pylint: disable=broad-except
-            print(f"error occured getting faculty url. Error: {e}")
-            continue
-    print("Finished looping through faculties.")
+    print("Looping through faculties...")
+    employee_ids = get_faculty_employees(max_missing=args.max_missing)
+    print(f"Finished looping through faculties. Crawling {len(employee_ids)} employees...")
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        employees_github_user_names = executor.map(get_all_employee_github_usernames,
+                                                   employee_ids)
+        for employee_id, github_user_names in zip(employee_ids, employees_github_user_names):
+            if github_user_names:
+                for github_user_name in github_user_names:
+                    COUNTER += 1
+                    print(f"Found user: '{github_user_name}'. "
+                          f"Employee ID: '{employee_id}'. Total: {COUNTER}")
+                    employee_github.append(
+                        [SERVICE, current_date, github_user_name, employee_id])
+    print("Finished crawling employees.")
     employee_github_pd = pd.DataFrame(employee_github,
                                       columns=["service", "date", "user_id", "UU_id"])
 
@@ -2,31 +2,50 @@
 This file retrieves Github usernames from PURE research output
 """
 import argparse
+import csv
+import sys
 from pathlib import Path
 from datetime import datetime
 
-import pandas as pd
 import rispy
 
+# make the shared modules in the project root importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from swords.handles import find_github_handles  # pylint: disable=wrong-import-position
+
 
 def get_username_from_text(text):
-    """Parses the PURE text for usernames
+    """Parses the PURE text for usernames, see swords.handles
 
     Args:
-        text (string): Text to be parsed
+        text (list): Fields of a PURE entry to be parsed. Fields can be lists of strings
 
     Returns:
-        string: Username
+        string: Username, the last one that is mentioned. None if there is none
+    """
+    retrieved_users = []
+    for field in text:
+        for value in field if isinstance(field, list) else [field]:
+            retrieved_users.extend(find_github_handles(str(value)))
+    return retrieved_users[-1] if retrieved_users else None
+
+
+def iter_entries(ris_file):
+    """Yields the entries of a RIS file one at a time. Only the lines of the current
+    entry are held in memory, so the size of the file does not matter.
+
+    Args:
+        ris_file (file): RIS file opened in text mode, or any iterable of lines
+
+    Yields:
+        dict: the next entry, as parsed by rispy
     """
-    retrieved_user = None
-    for word in text:
-        if "github.com" in word:
-            split = word.split("github.com/")
-            retrieved_user = split[1].split("/")[0]
-        elif "github.io" in word:
-            githubio_split = word.split(".")
-            retrieved_user = githubio_split[0].split("://")[1]
-    return retrieved_user
+    entry_lines = []
+    for line in ris_file:
+        entry_lines.append(line)
+        if line.startswith("ER  -"):  # end of the entry
+            yield from rispy.loads("".join(entry_lines))
+            entry_lines = []
 
 
 if __name__ == '__main__':
@@ -36,19 +55,20 @@ if __name__ == '__main__':
     parser.add_argument("file", help="Input file")
     args = parser.parse_args()
 
-    users = []
     SERVICE = "github.com"
     current_date = datetime.today().strftime('%Y-%m-%d')
+    num_users = 0
 
-    with open(args.file, 'r', encoding="utf8") as pure_data:
-        entries = rispy.load(pure_data)
-        for entry in entries:
+    # users are written as soon as they are found
+    with open(args.file, 'r', encoding="utf8") as pure_data, \
+            open(Path("results", "pure.csv"), 'w', encoding="utf8", newline="") as output:
+        writer = csv.writer(output, lineterminator="\n")
+        writer.writerow(["service", "date", "user_id"])
+        for entry in iter_entries(pure_data):
             user = get_username_from_text(entry.values())
             if user is not None:
-                users.append([SERVICE, current_date, user])
+                writer.writerow([SERVICE, current_date, user])
+                output.flush()
+                num_users += 1
 
-        print(f"Successfully parsed file {args.file}.")
-        pd.DataFrame(users,
-                     columns=["service", "date",
-                              "user_id"]).to_csv(Path("results", "pure.csv"),
-                                                 index=False)
+    print(f"Successfully parsed file {args.file}. Found {num_users} users.")
@@ -3,13 +3,22 @@ Enrich merged users from the merge_users.py output. Enriching means fetching the
 """
 import argparse
 import os
-import time
+import sys
 from datetime import datetime
+from functools import partial
+from pathlib import Path
 
 import pandas as pd
 from dotenv import load_dotenv
 from ghapi.all import GhApi
 
+# make the shared modules in the project root importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from swords.github_client import GitHubClient  # pylint: disable=wrong-import-position
+from swords.graphql import get_users  # pylint: disable=wrong-import-position
+from swords.ratelimit import RateLimiter  # pylint: disable=wrong-import-position
+from swords.storage import read_table, write_table  # pylint: disable=wrong-import-position
+
 
 class Service:
     """
@@ -23,22 +32,6 @@ class Service:
         self.sleep = sleep
 
 
-def read_input_file(file_path):
-    """reads in the input file through Pandas
-
-    Args:
-        file_path (string): path to the file
-
-    Returns:
-        DataFrame
-    """
-    if "xlsx" in file_path:
-        file = pd.read_excel(file_path, engine='openpyxl')
-    else:
-        file = pd.read_csv(file_path)
-    return file
-
-
 def get_userdata(user_list, service: Service):
     """Retrieves Github userdata from a list of users
 
@@ -67,12 +60,36 @@ def get_userdata(user_list, service: Service):
             print(e)
         if index % 10 == 0:
             print(f"Processed {index} out of {len(user_list)} users.")
-        time.sleep(service.sleep)
+    return pd.DataFrame(github_data)
+
+
+def get_userdata_graphql(user_list, service: Service, batch_size=50):
+    """Retrieves Github userdata from a list of users with batched GraphQL queries.
+    The users have the same columns as the users retrieved by get_userdata.
+
+    Args:
+        user_list (list): list of Github usernames
+        service (Service): Service object with API connection and metadata vars
+        batch_size (int): number of users per query. GitHub allows at most 100.
+
+    Returns:
+        DataFrame: Complete dataframe with enriched users
+    """
+    user_list = list(user_list)
+    github_data = []
+    for user_id, user in zip(user_list, get_users(service.api, user_list, batch_size)):
+        if user is None:
+            print(f"User {user_id} encountered an error.")
+        else:
+            github_data.append(user)
     return pd.DataFrame(github_data)
 
 
 def update_users(df_users_passed, df_new_users):
-    """Updates already enriched users with new data
+    """Updates already enriched users with new data. Existing users are matched on
+    user_id and all their fields are overwritten by the new data, also with missing
+    values. Users that do not exist yet are appended with a continuing index. If a
+    user occurs more than once in the new data, the last occurrence is used.
 
     Args:
         df_users_passed (DataFrame): Enriched users
@@ -81,23 +98,27 @@ def update_users(df_users_passed, df_new_users):
     Returns:
         DataFrame: Merged Dataframe with updated users
     """
-    df_users_copy = df_users_passed.copy()  # don't modify initial df
-    for row_new in df_new_users.iterrows():  # iterate over rows in first df
-        # get user_id from this row
-        user_id = row_new[1]['login']
-        # get keys and values
-        keys, values = zip(*[(key, value) for key, value in row_new[1].items()
-                             if key != "login"])
-        # find row index in df2 where login value corresponds to user_id, if it exists
-        index_row_annotated = df_users_copy.index[df_users_copy['user_id'] ==
-                                                  user_id]
-        if len(index_row_annotated) > 0:  # user exists already
-            df_users_copy.loc[index_row_annotated, keys] = values
-        else:  # user doesn't exist yet - insert
-            new_index = df_users_copy.index[-1] + 1
-            df_users_copy.loc[new_index, "user_id"] = user_id
-            df_users_copy.loc[new_index, keys] = values
-    return df_users_copy
+    df_updates = df_new_users.drop_duplicates("login", keep="last").set_index("login")
+    new_columns = [column for column in df_updates.columns
+                   if column not in df_users_passed.columns]
+    df_users_updated = df_users_passed.reindex(
+        columns=list(df_users_passed.columns) + new_columns)  # copy, don't modify initial df
+
+    # overwrite the fields of existing users, one column at a time
+    existing = df_users_updated["user_id"].isin(df_updates.index)
+    existing_ids = df_users_updated.loc[existing, "user_id"]
+    for column in df_updates.columns:
+        df_users_updated.loc[existing, column] = existing_ids.map(df_updates[column])
+
+    # append new users in the order in which they first occur in the new data
+    new_ids = df_new_users["login"].drop_duplicates()
+    new_ids = new_ids[~new_ids.isin(df_users_passed["user_id"])]
+    if new_ids.empty:
+        return df_users_updated
+    df_inserted = df_updates.loc[new_ids].rename_axis("user_id").reset_index()
+    first_index = df_users_updated.index[-1] + 1 if len(df_users_updated.index) > 0 else 0
+    df_inserted.index = range(first_index, first_index + len(df_inserted.index))
+    return pd.concat([df_users_updated, df_inserted.reindex(columns=df_users_updated.columns)])
 
 
 if __name__ == '__main__':
@@ -125,11 +146,26 @@ if __name__ == '__main__':
                         "-o",
                         help="file name of output.",
                         default="results/users_enriched.csv")
+    parser.add_argument(
+        "--cache",
+        help="Optional. Directory for a persistent cache of GitHub API responses."
+        " Cached responses are revalidated with conditional requests.")
+    parser.add_argument(
+        "--graphql",
+        "-gql",
+        action='store_true',
+        help="Set this flag to retrieve the users with batched GraphQL queries")
+    parser.add_argument(
+        "--graphql_batch_size",
+        "-gqlbs",
+        type=int,
+        help="Optional. Number of users per GraphQL query (at most 100).",
+        default=50)
 
     # Read arguments from the command line
     args = parser.parse_args()
 
-    df_users = read_input_file(args.input)
+    df_users = read_table(args.input)
     df_users = df_users.drop_duplicates("user_id").reset_index(drop=True)
 
     UPDATE_EVERYTHING = args.update
@@ -137,7 +173,7 @@ if __name__ == '__main__':
     if args.fileupdate:
         try:
             # If this block is successfully executed it is an update of users
-            df_users_annotated = read_input_file(args.fileupdate)
+            df_users_annotated = read_table(args.fileupdate)
             df_users["new_user"] = False
             df_users.loc[~df_users["user_id"].
                          isin(df_users_annotated["user_id"].str.lower()),
@@ -151,14 +187,15 @@ if __name__ == '__main__':
             print("No new users.")
 
     load_dotenv()
-    # if unauthorized API is used, rate limit is lower leading to a ban and
-    # waiting time needs to be increased
+    # requests are paced by the rate limit headers of the responses. If unauthorized
+    # API is used, the rate limit is lower and requests are paced accordingly
     token = os.getenv('GITHUB_TOKEN')
-    if token is not None:  # authentication
-        SLEEP = 2
-    else:  # no authentication
-        SLEEP = 6
-    serv = Service(api=GhApi(token=token), sleep=SLEEP)
+    serv = Service(api=GitHubClient(token=token, cache_dir=args.cache, limiter=RateLimiter()))
+    if args.graphql:
+        # many users are retrieved with one query, with the same columns as the REST API
+        retrieve_userdata = partial(get_userdata_graphql, batch_size=args.graphql_batch_size)
+    else:
+        retrieve_userdata = get_userdata
 
     if 'new_user' in df_users.columns:  # updating users
         if UPDATE_EVERYTHING:
@@ -168,7 +205,7 @@ if __name__ == '__main__':
                 df_users_annotated,
                 on="user_id",
                 how="outer")
-            results_github_user_api = get_userdata(
+            results_github_user_api = retrieve_userdata(
                 df_users_all["user_id"], serv)
 
         else:  # only add new users
@@ -177,13 +214,13 @@ if __name__ == '__main__':
                                        left_on="user_id",
                                        right_on="user_id",
                                        how="left")
-            results_github_user_api = get_userdata(
+            results_github_user_api = retrieve_userdata(
                 df_users_update["user_id"], serv)
 
         df_users_enriched = update_users(df_users_annotated,
                                          results_github_user_api)
     else:  # first time collecting data
-        results_github_user_api = get_userdata(df_users["user_id"], serv)
+        results_github_user_api = retrieve_userdata(df_users["user_id"], serv)
         results_github_user_api["login"] = results_github_user_api[
             "login"].str.lower(
         )  # key to merge is lowercase so this needs to be lowercase as well
@@ -194,9 +231,6 @@ if __name__ == '__main__':
         df_users_enriched.drop(["login"], axis=1, inplace=True)
 
     df_users_enriched["date"] = serv.current_date
-    if "xlsx" in args.output:
-        df_users_enriched.to_excel(args.output, index=False)
-    else:
-        df_users_enriched.to_csv(args.output, index=False)
+    write_table(df_users_enriched, args.output)
 
     print("Successfully enriched users.")
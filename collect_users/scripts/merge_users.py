@@ -4,11 +4,16 @@ Merges users from the different retrieval methods
 import argparse
 import glob
 import pathlib
+import sys
 from pathlib import Path
 from datetime import datetime
 
 import pandas as pd
 
+# make the shared modules in the project root importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from swords.storage import read_table, write_table  # pylint: disable=wrong-import-position
+
 if __name__ == '__main__':
 
     # Initiate the parser
@@ -39,7 +44,7 @@ if __name__ == '__main__':
 
     print(f"Parsing files for... \n {data_files}")
     df_github_names_long = pd.concat(
-        [pd.read_csv(fp) for fp in data_files],
+        [read_table(fp) for fp in data_files],
         axis=0,
         keys=data_files,
         names=["source", "row"]).reset_index("source").reset_index(drop=True)
@@ -58,5 +63,5 @@ if __name__ == '__main__':
 
     current_date = datetime.today().strftime('%Y-%m-%d')
     df_users["date"] = current_date
-    df_users.to_csv(Path(args.output), index=False)
+    write_table(df_users, args.output)
     print("Successfully merged users.")
@@ -3,25 +3,15 @@ Prepare enriched data to be manually filtered.
 This file adds columns and info whether a user is a student.
 """
 import argparse
+import sys
 from datetime import datetime
+from pathlib import Path
 
 import pandas as pd
 
-
-def read_input_file(file_path):
-    """reads in the input file through Pandas
-
-    Args:
-        file_path (string): path to the file
-
-    Returns:
-        DataFrame
-    """
-    if "xlsx" in file_path:
-        file = pd.read_excel(file_path, engine='openpyxl')
-    else:
-        file = pd.read_csv(file_path)
-    return file
+# make the shared modules in the project root importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from swords.storage import read_table, write_table  # pylint: disable=wrong-import-position
 
 
 def is_student(user_bio):
@@ -60,7 +50,7 @@ if __name__ == '__main__':
                         default="results/users_enriched.csv")
     args = parser.parse_args()
 
-    df_users_enriched = read_input_file(args.input)
+    df_users_enriched = read_table(args.input)
 
     df_users_enriched["is_student"] = df_users_enriched['bio'].apply(
         is_student)
@@ -88,9 +78,6 @@ if __name__ == '__main__':
 
     current_date = datetime.today().strftime('%Y-%m-%d')
     df_users_enriched["date"] = current_date
-    if "xlsx" in args.output:
-        df_users_enriched.to_excel(args.output, index=False)
-    else:
-        df_users_enriched.to_csv(args.output, index=False)
+    write_table(df_users_enriched, args.output)
 
     print("Successfully prepared filtering.")
@@ -1,23 +1,42 @@
 """
 This file retrieves all variables in JSON format. Used for Kibana dashboard visualization.
 """
-import time
 import os
+import sys
 import ast
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
 import simplejson as json
 from dotenv import load_dotenv
-from ghapi.all import GhApi
 
-from github_api.github import get_data_from_api, read_input_file, Service, Repo
-from howfairis_api.howfairis_variables import parse_repo
+# make the shared modules in the project root importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+from collect_variables.scripts.github_api.github import (  # pylint: disable=wrong-import-position
+    get_data_from_api, Service, Repo)
+from collect_variables.scripts.howfairis_api.howfairis_variables import (  # pylint: disable=wrong-import-position
+    parse_repo)
+from swords.github_client import GitHubClient  # pylint: disable=wrong-import-position
+from swords.ratelimit import RateLimiter  # pylint: disable=wrong-import-position
+from swords.snapshot import get_unchanged_repos  # pylint: disable=wrong-import-position
+from swords.storage import read_table  # pylint: disable=wrong-import-position
+
 
+# keys of the nested variables in the documents
+CONTRIBUTOR_KEYS = ["contributor", "contributions"]
+LANGUAGE_KEYS = ["language", "num_chars"]
+HOWFAIRIS_KEYS = ["howfairis_repository", "howfairis_license", "howfairis_registry",
+                  "howfairis_citation", "howfairis_checklist"]
 
-def add_data_from_api(service, repo, variable_type, keys):
+
+def add_data_from_api(data, service, repo, variable_type, keys):
     """Retrieves Github API data. Utilizes the function from github_api/github.py to do so.
     This function adds the retrieved variables directly to the data dictionary.
 
     Args:
+        data (dict): document of the repository
         service (Service): Service object with API connection and metadata vars
         repo    (Repo)   : Repository variables bundled together
         variable_type (string): which type of variable should be retrieved.
@@ -39,14 +58,225 @@ def add_data_from_api(service, repo, variable_type, keys):
             data[keys[0]] = retrieved_data[1]
     else:
         return False
-    time.sleep(2)
     return True
 
 
+def add_howfairis_data(data, url):
+    """Retrieves the howfairis variables of a repository and adds them to the data dictionary
+
+    Args:
+        data (dict): document of the repository
+        url (string): repository url
+    """
+    howfairis_values = parse_repo(url)
+    data["howfairis"] = (dict(zip(HOWFAIRIS_KEYS, howfairis_values[1:]))
+                         if howfairis_values is not None else {})
+
+
+def get_general_data(row, current_date):
+    """Returns the variables of a repository that are taken from the repositories data
+
+    Args:
+        row (Series): row of the repositories data
+        current_date (string): date of the collection
+
+    Returns:
+        dict: general variables, followed by the Github data after the API links
+    """
+    general_keys = ["url", "owner", "repository_name",
+                    "date_all_variable_collection", "description"]
+    general_values = [row["html_url"], row["owner"], row["name"], current_date,
+                      row["description"]]
+    data = dict(zip(general_keys, general_values))
+    # remove topics from index slice to not have topics twice
+    data.update(row.drop(labels="topics")[54:78].items())
+    return data
+
+
+def get_repo_data(service, row, concurrent=False):
+    """Retrieves all variables of a repository. The contributors, howfairis variables,
+    languages and readme are independent of each other. If `concurrent` is True, they
+    are retrieved at the same time, otherwise one after another.
+
+    Args:
+        service (Service): Service object with API connection and metadata vars
+        row (Series): row of the repositories data
+        concurrent (boolean): whether to retrieve the variables concurrently
+
+    Returns:
+        dict: document of the repository, None if the contributors could not be retrieved
+    """
+    repository = Repo(repo_url=row["html_url"],
+                      repo_owner=row["owner"],
+                      repo_repo_name=row["name"],
+                      repo_branch=row["default_branch"])
+    fetched = {}
+    with ThreadPoolExecutor(max_workers=4 if concurrent else 1) as executor:
+        contributors_future = executor.submit(add_data_from_api, fetched, service, repository,
+                                              "contributors", CONTRIBUTOR_KEYS)
+        if not concurrent and not contributors_future.result():
+            return None
+        futures = [
+            executor.submit(add_howfairis_data, fetched, row["html_url"]),
+            executor.submit(add_data_from_api, fetched, service, repository, "languages",
+                            LANGUAGE_KEYS),
+            executor.submit(add_data_from_api, fetched, service, repository, "readmes",
+                            ["readme"]),
+        ]
+    if not contributors_future.result():
+        return None
+    for future in futures:
+        future.result()
+    # the keys are added in a fixed order, independent of the order of completion
+    data = get_general_data(row, service.current_date)
+    data["contributors"] = fetched["contributors"]
+    data["howfairis"] = fetched["howfairis"]
+    data["topics"] = ast.literal_eval(row["topics"])
+    data["languages"] = fetched["languages"]
+    if "readme" in fetched:
+        data["readme"] = fetched["readme"]
+    return data
+
+
+def group_records(df_variables, keys, url_column="html_url_repository"):
+    """Groups the rows of a table of variables by repository in a single pass
+
+    Args:
+        df_variables (DataFrame): variables with one row per entry of a repository
+        keys (list): columns of the entries, also used as keys of the entries
+        url_column (string): column with the repository url
+
+    Returns:
+        dict: list of entries per repository url, in the order of the table
+    """
+    grouped = {}
+    columns = [df_variables[key].tolist() for key in keys]
+    for url, *values in zip(df_variables[url_column].tolist(), *columns):
+        grouped.setdefault(url, []).append(dict(zip(keys, values)))
+    return grouped
+
+
+def assemble_repo_data(df_repositories, df_contributors, df_languages, df_readmes,
+                       df_howfairis, current_date):
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    """Assembles the documents of the repositories from the variables that were already
+    retrieved by github.py and howfairis_variables.py, without sending requests. Each
+    table is read in a single pass. The documents have the same keys as the documents
+    of get_repo_data. As in get_repo_data, repositories without contributors are skipped.
+    Other variables that are missing for a repository are left empty.
+
+    Args:
+        df_repositories (DataFrame): repositories data
+        df_contributors (DataFrame): contributors, with login and contributions columns
+        df_languages (DataFrame): languages, with language and num_chars columns
+        df_readmes (DataFrame): readmes, with a readme column
+        df_howfairis (DataFrame): howfairis variables, see HOWFAIRIS_KEYS
+        current_date (string): date of the collection
+
+    Yields:
+        dict: document of each repository with contributors, in the order of the
+              repositories data
+    """
+    contributors = group_records(
+        df_contributors.rename(columns={"login": "contributor"}), CONTRIBUTOR_KEYS)
+    languages = group_records(df_languages, LANGUAGE_KEYS)
+    readmes = dict(zip(df_readmes["html_url_repository"], df_readmes["readme"]))
+    howfairis = {url: entries[-1]
+                 for url, entries in group_records(df_howfairis, HOWFAIRIS_KEYS,
+                                                   url_column="html_url").items()}
+    for _, row in df_repositories.iterrows():
+        url = row["html_url"]
+        if url not in contributors:
+            # the contributors of deleted, private and empty repositories can not be retrieved
+            continue
+        data = get_general_data(row, current_date)
+        data["contributors"] = contributors[url]
+        data["howfairis"] = howfairis.get(url, {})
+        data["topics"] = ast.literal_eval(row["topics"])
+        data["languages"] = languages.get(url, [])
+        if url in readmes:
+            data["readme"] = readmes[url]
+        yield data
+
+
+def get_repo_line(service, row, unchanged_records, concurrent=False):
+    """Returns the output line of a repository, see get_repo_data
+
+    Args:
+        service (Service): Service object with API connection and metadata vars
+        row (Series): row of the repositories data
+        unchanged_records (dict): lines of the previous output of unchanged repositories
+        concurrent (boolean): whether to retrieve the variables concurrently
+
+    Returns:
+        string: JSON line of the repository, None if the repository is skipped
+    """
+    if row["html_url"] in unchanged_records:
+        return unchanged_records[row["html_url"]]
+    data = get_repo_data(service, row, concurrent)
+    if data is None:
+        print(
+            f"Repository {row['name']} encountered issues, most likely repository does not"
+            " exist anymore or is private. Skipping repository."
+        )
+        return None
+    print(data)
+    return json.dumps(data, ignore_nan=True) + "\n"
+
+
+def get_repo_lines(service, df_repositories, unchanged_records, workers=1, concurrent=False):
+    """Returns the output lines of the repositories, see get_repo_line. Up to `workers`
+    repositories are retrieved concurrently, the lines are returned in the order of the input.
+
+    Args:
+        service (Service): Service object with API connection and metadata vars
+        df_repositories (DataFrame): repositories data
+        unchanged_records (dict): lines of the previous output of unchanged repositories
+        workers (int): number of repositories that are retrieved concurrently
+        concurrent (boolean): whether to retrieve the variables of a repository concurrently
+
+    Yields:
+        string: JSON line of each repository, None if the repository is skipped
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(
+            lambda row: get_repo_line(service, row, unchanged_records, concurrent),
+            (row for _, row in df_repositories.iterrows()))
+
+
+def write_repo_lines(lines, output, num_repos, replace=False):
+    """Writes the output lines of the repositories, skipping the repositories without a line.
+
+    Args:
+        lines (iterable): output lines, see get_repo_lines
+        output (string): file path
+        num_repos (int): number of repositories, used to report the progress
+        replace (boolean): if True, the lines replace the existing output. They are written
+            to a temporary file next to the output, which replaces the output only after
+            all lines are written, so an interrupted run keeps the previous output.
+            Otherwise, the lines are appended to the output.
+    """
+    path = Path(output)
+    target = path.with_name(path.name + ".tmp") if replace else path
+    try:
+        with open(target, "w" if replace else "a", encoding="utf8") as output_file:
+            for counter, repo_line in enumerate(lines):
+                if repo_line is not None:
+                    output_file.write(repo_line)
+                    output_file.flush()
+                if counter % 10 == 0:
+                    print(f"Parsed {counter} out of {num_repos} repos.")
+    except BaseException:
+        if replace:
+            target.unlink(missing_ok=True)
+        raise
+    if replace:
+        os.replace(target, path)
+
+
 if __name__ == '__main__':
     load_dotenv()
     token = os.getenv('GITHUB_TOKEN')
-    serv = Service(api=GhApi(token=token))
     # Initiate the parser
     parser = argparse.ArgumentParser()
 
@@ -61,56 +291,84 @@ if __name__ == '__main__':
                         help="The file name of the output.",
                         default="results/all_variables.json")
 
+    parser.add_argument("--cache",
+                        help="Optional. Directory for a persistent cache of GitHub API responses."
+                             " Cached responses are revalidated with conditional requests.")
+
+    parser.add_argument("--previous_input",
+                        help="Optional. The repositories data of the previous run. Only"
+                             " repositories that are new or were pushed to since then are"
+                             " retrieved, the others are copied from the existing output.")
+
+    parser.add_argument("--workers",
+                        "-w",
+                        type=int,
+                        help="Optional. Number of repositories that are retrieved concurrently."
+                             " All workers share one rate limit budget.",
+                        default=1)
+
+    parser.add_argument("--concurrent",
+                        action="store_true",
+                        help="Set this flag to retrieve the contributors, howfairis variables,"
+                             " languages and readme of a repository concurrently.")
+
+    parser.add_argument("--assemble",
+                        action="store_true",
+                        help="Set this flag to assemble the output from the variables that"
+                             " were already retrieved, without sending requests.")
+    parser.add_argument("--contributors_input",
+                        help="Optional. Contributors retrieved by github.py, used with"
+                             " --assemble.",
+                        default="results/contributors.csv")
+    parser.add_argument("--languages_input",
+                        help="Optional. Languages retrieved by github.py, used with --assemble.",
+                        default="results/languages.csv")
+    parser.add_argument("--readmes_input",
+                        help="Optional. Readmes retrieved by github.py, used with --assemble.",
+                        default="results/readmes.csv")
+    parser.add_argument("--howfairis_input",
+                        help="Optional. Variables retrieved by howfairis_variables.py, used"
+                             " with --assemble.",
+                        default="results/howfairis.csv")
+
     # Read arguments from the command line
     args = parser.parse_args()
-    df_repos = read_input_file(args.input)
-
-
-
-
-    for counter, row in df_repos.iterrows():
-        url, owner = row["html_url"], row["owner"]
-        repo_name, description = row["name"], row["description"]
-        branch = row["default_branch"]
-        topics_str = row["topics"]
-        general_keys = ["url", "owner", "repository_name",
-                        "date_all_variable_collection", "description"]
-        general_values = [url, owner, repo_name, serv.current_date, description]
-        data = dict(zip(general_keys, general_values))
-
-        # remove topics from index slice to not have topics twice
-        row.drop(labels="topics", inplace=True)
-        # add all Github data after the API links
-        data.update(row[54:78].items())
-
-        contrib_keys = ["contributor", "contributions"]
-        lang_keys = ["language", "num_chars"]
-        howfairis_keys = ["howfairis_repository", "howfairis_license", "howfairis_registry",
-                          "howfairis_citation", "howfairis_checklist"]
-        readme_key = ["readme"]
-
-        repository = Repo(repo_url = url,
-                          repo_owner = owner,
-                          repo_repo_name=repo_name,
-                          repo_branch=branch)
-
-        REQUEST_SUCCESSFUL = add_data_from_api(serv, repository, "contributors", contrib_keys)
-        if REQUEST_SUCCESSFUL:
-            howfairis_values = parse_repo(url)
-            data["howfairis"] = dict(zip(howfairis_keys, howfairis_values[1:]))
-            topics = ast.literal_eval(topics_str)
-            data["topics"] = topics
-            add_data_from_api(serv, repository, "languages", lang_keys)
-            add_data_from_api(serv, repository, "readmes", readme_key)
-            print(data)
-
-            with open(args.output, "a", encoding="utf8") as fp:
-                json.dump(data, fp, ignore_nan=True)
+    if args.assemble:
+        documents = assemble_repo_data(
+            read_table(args.input),
+            read_table(args.contributors_input,
+                       columns=["html_url_repository", "login", "contributions"]),
+            read_table(args.languages_input,
+                       columns=["html_url_repository", "language", "num_chars"]),
+            read_table(args.readmes_input, columns=["html_url_repository", "readme"]),
+            read_table(args.howfairis_input, columns=["html_url", *HOWFAIRIS_KEYS]),
+            datetime.today().strftime('%Y-%m-%d'))
+        num_documents = 0
+        with open(args.output, "w", encoding="utf8") as fp:
+            for document in documents:
+                json.dump(document, fp, ignore_nan=True)
                 fp.write("\n")
-        else:
-            print(
-                f"Repository {repo_name} encountered issues, most likely repository does not"
-                 "exist anymore or is private. Skipping repository."
-            )
-        if counter % 10 == 0:
-            print(f"Parsed {counter} out of {len(df_repos.index)} repos.")
+                num_documents += 1
+        print(f"Assembled {num_documents} repositories. Saved result to {args.output}.")
+    else:
+        serv = Service(api=GitHubClient(token=token, cache_dir=args.cache, limiter=RateLimiter()))
+        df_repos = read_table(args.input)
+
+        previous_records = {}
+        rewrite_output = bool(args.previous_input) and os.path.exists(args.output)
+        if rewrite_output:
+            unchanged_repos = get_unchanged_repos(df_repos, read_table(args.previous_input))
+            with open(args.output, encoding="utf8") as fp:
+                for line in fp:
+                    record_url = json.loads(line)["url"]
+                    if record_url in unchanged_repos:
+                        previous_records[record_url] = line
+            print(f"{len(previous_records)} out of {len(df_repos.index)} repositories are"
+                  " unchanged since the previous run.")
+
+        # the repositories are processed by the workers, the lines are written
+        # by this thread only, in the order of the input. The output is rewritten
+        # with the unchanged records and the retrieved records
+        write_repo_lines(get_repo_lines(serv, df_repos, previous_records, args.workers,
+                                        args.concurrent),
+                         args.output, len(df_repos.index), replace=rewrite_output)
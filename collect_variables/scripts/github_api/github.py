@@ -2,16 +2,128 @@
 This file retrieves Github API variables for an input file with repositories.
 """
 import os
-import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
 import ast
 import argparse
 import base64
+import hashlib
+import json
+import sys
+import tempfile
+import threading
 
 import pandas as pd
 from dotenv import load_dotenv
 from ghapi.all import GhApi, paged
 from fastcore.foundation import L
+from fastcore.xtras import dict2obj, obj2dict
+
+# make the shared modules in the project root importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from swords.contributors import (CONTRIBUTOR_SCHEMA,  # pylint: disable=wrong-import-position
+                                 join_contributors, split_contributors)
+from swords.github_client import GitHubClient  # pylint: disable=wrong-import-position
+from swords.graphql import get_repositories  # pylint: disable=wrong-import-position
+from swords.ratelimit import RateLimiter  # pylint: disable=wrong-import-position
+from swords.retry import RetryPolicy, get_status  # pylint: disable=wrong-import-position
+from swords.snapshot import (get_unchanged_repos,  # pylint: disable=wrong-import-position
+                             select_rows)
+from swords.storage import read_table, write_table  # pylint: disable=wrong-import-position
+from swords.streaming import StreamingExport  # pylint: disable=wrong-import-position
+
+
+class TreeCache:
+    """
+    Cache for recursive git trees, shared by the file and test location lookups.
+
+    Trees are keyed on (owner, repository name, branch, pushed_at). A branch points to
+    a new tree after every push, so the time of the last push identifies the tree.
+    directory (string): Optional. If set, trees are also stored as JSON files in this
+        directory and reused in later runs, until the repository is pushed to.
+    max_size (int): maximum size in bytes of the cached trees, in memory and on disk
+        separately. The least recently used trees are evicted first.
+    """
+
+    def __init__(self, directory=None, max_size=256 * 1024 ** 2):
+        self.directory = Path(directory) if directory else None
+        self.max_size = max_size
+        self.trees = OrderedDict()  # key -> (tree, size in bytes)
+        self.size = 0
+        self.lock = threading.Lock()
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def get_path(self, key):
+        """Returns the file path of a cache key in the cache directory"""
+        digest = hashlib.sha1("/".join(str(part) for part in key).encode()).hexdigest()
+        return self.directory / f"{digest}.json"
+
+    def get(self, key):
+        """Returns the cached tree for a key, or None if it is not cached
+
+        Args:
+            key (tuple): owner, repository name, branch and time of the last push
+        """
+        with self.lock:
+            if key in self.trees:
+                self.trees.move_to_end(key)
+                return self.trees[key][0]
+        if self.directory is not None:
+            path = self.get_path(key)
+            if path.exists():
+                data = path.read_text(encoding="utf8")
+                try:
+                    tree = dict2obj(json.loads(data))
+                except ValueError:  # e.g. a partially written file of an interrupted run
+                    path.unlink(missing_ok=True)
+                    return None
+                path.touch()  # mark as recently used for disk eviction
+                self.store(key, tree, len(data))
+                return tree
+        return None
+
+    def put(self, key, tree, persist=True):
+        """Adds a tree to the cache and evicts the least recently used trees if necessary
+
+        Args:
+            key (tuple): owner, repository name, branch and time of the last push
+            tree (AttrDict): tree retrieved from the GitHub API
+            persist (boolean): if False, the tree is only kept in memory
+        """
+        data = json.dumps(obj2dict(tree))
+        self.store(key, tree, len(data))
+        if self.directory is not None and persist:
+            # the file is replaced at once, so an interrupted run leaves no partial file
+            with tempfile.NamedTemporaryFile("w", encoding="utf8", dir=self.directory,
+                                             suffix=".tmp", delete=False) as fp:
+                fp.write(data)
+            os.replace(fp.name, self.get_path(key))
+            self.evict_files()
+
+    def store(self, key, tree, size):
+        """Stores a tree in memory and evicts the least recently used trees if necessary"""
+        with self.lock:
+            if key in self.trees:
+                self.size -= self.trees.pop(key)[1]
+            self.trees[key] = (tree, size)
+            self.size += size
+            while self.size > self.max_size and len(self.trees) > 1:
+                self.size -= self.trees.popitem(last=False)[1][1]
+
+    def evict_files(self):
+        """Removes the least recently used files if the cache directory exceeds the maximum size"""
+        with self.lock:
+            files = sorted(self.directory.glob("*.json"), key=lambda path: path.stat().st_mtime)
+            total_size = sum(path.stat().st_size for path in files)
+            for path in files[:-1]:
+                if total_size <= self.max_size:
+                    break
+                total_size -= path.stat().st_size
+                path.unlink()
 
 
 class Service:
@@ -24,6 +136,31 @@ class Service:
         self.current_date = datetime.today().strftime('%Y-%m-%d')
         self.sleep = sleep
         self.file_list = None
+        self.full_commit_history = False
+        self.tree_cache = TreeCache()
+        # the rate limit budget is tracked from the headers of the data responses
+        self.limiter = getattr(api, "limiter", None) or RateLimiter(min_interval=sleep)
+
+    @property
+    def remaining_requests(self):
+        """Remaining GitHub requests in the current rate limit window, None if unknown"""
+        if getattr(self.api, "limiter", None) is not self.limiter:
+            # the api does not pass the headers on to the limiter itself
+            self.limiter.update(getattr(self.api, "recv_hdrs", None))
+        return self.limiter.remaining
+
+    @property
+    def rate_limit_reset(self):
+        """Epoch seconds at which the rate limit resets, None if unknown"""
+        return self.limiter.reset
+
+    def check_rate_limit(self):
+        """Prints the remaining GitHub requests.
+
+        The budget is read from the headers of the previous responses,
+        so no additional request is sent.
+        """
+        print(f"Remaining GitHub requests: {self.remaining_requests}")
 
 
 class Repo:
@@ -35,29 +172,16 @@ class Repo:
     owner (string): repository owner. E.g.: kequach
     repo_name (string): repository name. E.g.: HTML-Examples
     branch (string): repository default branch. E.g.: main / master
+    pushed_at (string): Optional. Time of the last push. E.g.: 2022-08-12T09:13:42Z
     """
 
-    def __init__(self, repo_url, repo_owner, repo_repo_name, repo_branch="main"):
+    def __init__(self, repo_url, repo_owner, repo_repo_name, repo_branch="main",
+                 repo_pushed_at=None):
         self.url = repo_url
         self.owner = repo_owner
         self.repo_name = repo_repo_name
         self.branch = repo_branch
-
-
-def read_input_file(file_path):
-    """reads in the input file through Pandas
-
-    Args:
-        file_path (string): path to the file
-
-    Returns:
-        DataFrame
-    """
-    if "xlsx" in file_path:
-        input_file = pd.read_excel(file_path, engine='openpyxl')
-    else:
-        input_file = pd.read_csv(file_path)
-    return input_file
+        self.pushed_at = repo_pushed_at
 
 
 def export_file(variables_retrieved, columns, var_type, output):
@@ -72,7 +196,7 @@ def export_file(variables_retrieved, columns, var_type, output):
     df_data = pd.DataFrame(variables_retrieved, columns=columns)
     current_date = datetime.today().strftime('%Y-%m-%d')
     df_data["date"] = current_date
-    df_data.to_csv(output, index=False)
+    write_table(df_data, output)
     print(
         f"Successfully retrieved {var_type} variables. Saved result to {output}."
     )
@@ -144,6 +268,28 @@ def get_readmes(service: Service, repo: Repo):
     return readme_data
 
 
+def get_tree(service: Service, repo: Repo):
+    """Retrieves the recursive git tree of the repository branch.
+    The tree is retrieved from the tree cache of the service if it was fetched before
+    for the same push. Trees of repositories without a known time of the last push
+    are not stored on disk, as they could be outdated in a later run.
+
+    Args:
+        service (Service): Service object with API connection and metadata vars
+        repo    (Repo)   : Repository variables bundled together
+
+    Returns:
+        AttrDict: git tree retrieved from Github
+    """
+    key = (repo.owner, repo.repo_name, repo.branch, repo.pushed_at)
+    content = service.tree_cache.get(key)
+    if content is None:
+        content = service.api.git.get_tree(owner=repo.owner, repo=repo.repo_name,
+                                           tree_sha=repo.branch, recursive=1)
+        service.tree_cache.put(key, content, persist=repo.pushed_at is not None)
+    return content
+
+
 def get_file_locations(service: Service, repo: Repo, file_names):
     """Retrieves file locations of a file name search for a Github repository.
 
@@ -157,8 +303,7 @@ def get_file_locations(service: Service, repo: Repo, file_names):
         list: file name list retrieved from Github
     """
     result = []
-    content = service.api.git.get_tree(owner=repo.owner, repo=repo.repo_name,
-                                       tree_sha=repo.branch, recursive=1)
+    content = get_tree(service, repo)
     for file in content["tree"]:
         if any(file_name.lower() in file.path.lower() for file_name in file_names):
             file_names_entry = [repo.url, file["path"]]
@@ -169,8 +314,11 @@ def get_file_locations(service: Service, repo: Repo, file_names):
 
 def get_commit_variables(service: Service, repo: Repo):
     """Retrieves commit dates of a repository.
-    Design decision to use slower sequential pagination to do less requests.
-    Parallel pages retrieval required an additional request.
+    Only the newest and the oldest commit are needed. By default, the first page with
+    one commit per page is requested and the Link header of the response is used to
+    request the last page directly, so at most two requests are sent per repository.
+    If `full_commit_history` of the service is set, all commits are paged through
+    sequentially instead.
 
     Args:
         service (Service): Service object with API connection and metadata vars
@@ -182,29 +330,39 @@ def get_commit_variables(service: Service, repo: Repo):
             life span of the repository measured as days between first and last commit,
             whether the repository is still active (was there a commit within the last 365 days?)
     """
-    commit_pages = paged(service.api.repos.list_commits, owner=repo.owner,
-                         repo=repo.repo_name, per_page=100)
-    commit_dates = []
-    result = []
-    for page in commit_pages:
-        for commit in page:
-            commit_dates.append(datetime.strptime(commit["commit"]["author"]["date"],
-                                                  "%Y-%m-%dT%H:%M:%SZ"))
-            first_commit = commit # this will be the first commit after finishing the loops
-
-    vcs_usage = commit_dates[0].date() != commit_dates[-1].date()
-    life_span = (commit_dates[0].date() - commit_dates[-1].date()).days
-    repo_active = (datetime.today().date() - commit_dates[0].date()) < timedelta(days=365)
+    if service.full_commit_history:
+        commit_pages = paged(service.api.repos.list_commits, owner=repo.owner,
+                             repo=repo.repo_name, per_page=100)
+        last_commit = first_commit = None
+        for page in commit_pages:
+            for commit in page:
+                last_commit = last_commit or commit
+                first_commit = commit # this will be the first commit after finishing the loops
+    else:
+        last_commit = first_commit = service.api.repos.list_commits(
+            owner=repo.owner, repo=repo.repo_name, per_page=1, page=1)[0]
+        # the number of the last page is the number of commits.
+        # The headers of the previous response are read, see GitHubClient.recv_hdrs
+        num_commits = service.api.last_page()
+        if num_commits > 1:
+            first_commit = service.api.repos.list_commits(
+                owner=repo.owner, repo=repo.repo_name, per_page=1, page=num_commits)[0]
+
+    last_commit_date = datetime.strptime(last_commit["commit"]["author"]["date"],
+                                         "%Y-%m-%dT%H:%M:%SZ")
+    first_commit_date = datetime.strptime(first_commit["commit"]["author"]["date"],
+                                          "%Y-%m-%dT%H:%M:%SZ")
+    vcs_usage = last_commit_date.date() != first_commit_date.date()
+    life_span = (last_commit_date.date() - first_commit_date.date()).days
+    repo_active = (datetime.today().date() - last_commit_date.date()) < timedelta(days=365)
 
     # no valid GitHub user did the first commit
     if first_commit["author"] is None or len(first_commit["author"]) == 0:
         first_commit_user = None
     else:
         first_commit_user = first_commit["author"]["login"]
-    first_commit_date = commit_dates[-1].strftime('%Y-%m-%d')
-    result.append([repo.url, vcs_usage, life_span,
-                   repo_active, first_commit_user, first_commit_date])
-    return result
+    return [[repo.url, vcs_usage, life_span, repo_active, first_commit_user,
+             first_commit_date.strftime('%Y-%m-%d')]]
 
 
 def get_test_location(service: Service, repo: Repo):
@@ -218,8 +376,7 @@ def get_test_location(service: Service, repo: Repo):
         list: test folder list retrieved from Github
     """
     result = []
-    content = service.api.git.get_tree(owner=repo.owner, repo=repo.repo_name,
-                                       tree_sha=repo.branch, recursive=1)
+    content = get_tree(service, repo)
     for file in content["tree"]:
         if "test" in file.path.lower() and file.type == "tree":
             folder_names_entry = [repo.url, file["path"]]
@@ -248,22 +405,71 @@ def get_version_identifiability(service: Service, repo: Repo):
     tags = service.api.repos.list_tags(owner=repo.owner,
                          repo=repo.repo_name, per_page=100)
     result = []
-    version_identifiability = None
     if tags:
-        for tag in tags:
-            split = tag["name"].split(".")
-            if len(split) in [2,3]:
-                version_identifiability = True
-            else: # all versions must follow the scheme. If one is wrong, exit
-                version_identifiability = False
-                break
-        result.append([repo.url, version_identifiability])
+        result.append([repo.url, check_version_scheme([tag["name"] for tag in tags])])
         return result
     return result
 
 
-def get_data_from_api(service: Service, repo: Repo, variable_type, verbose=True):
-    """The function calls the ghapi api to retrieve
+def check_version_scheme(tag_names):
+    """Checks whether all tags follow the scheme: X.X or X.X.X
+
+    Args:
+        tag_names (list): names of the tags of a repository
+
+    Returns:
+        boolean: whether all tags follow the version scheme
+    """
+    version_identifiability = None
+    for tag_name in tag_names:
+        split = tag_name.split(".")
+        if len(split) in [2,3]:
+            version_identifiability = True
+        else: # all versions must follow the scheme. If one is wrong, exit
+            version_identifiability = False
+            break
+    return version_identifiability
+
+
+# GhApi raises the HTTP errors of urllib, which are classified by their status code.
+# The rate limiter of the client already delays requests when the remaining budget is low
+retry_policy = RetryPolicy()
+
+
+def get_variables(service: Service, repo: Repo, variable_type, verbose=True):
+    """Retrieves one type of variables of a repository, see get_data_from_api
+
+    Returns:
+        list: A list of the retrieved variables
+    """
+    retrieved_variables = []
+    if variable_type == "contributors":
+        retrieved_variables.extend(
+            get_contributors(service, repo, verbose))
+    elif variable_type == "languages":
+        retrieved_variables.extend(get_languages(service, repo))
+    elif variable_type == "readmes":
+        retrieved_variables.extend(
+            get_readmes(service, repo))
+    elif variable_type == "files":
+        retrieved_variables.extend(
+            get_file_locations(service, repo, service.file_list))
+    elif variable_type == "tests":
+        retrieved_variables.extend(
+            get_test_location(service, repo))
+    elif variable_type == "commits":
+        retrieved_variables.extend(
+            get_commit_variables(service, repo))
+    elif variable_type == "versions":
+        retrieved_variables.extend(
+            get_version_identifiability(service, repo))
+    return retrieved_variables
+
+
+def get_data_from_api(service: Service, repo: Repo, variable_type, verbose=True,
+                      check_rate_limit=True):
+    """The function calls the ghapi api to retrieve. Temporary failures, such as
+    server errors and exceeded rate limits, are retried according to retry_policy.
 
     Args:
         service (Service): Service object with API connection and metadata vars
@@ -272,65 +478,238 @@ def get_data_from_api(service: Service, repo: Repo, variable_type, verbose=True)
                                 contributors, languages, readmes, files, commits, versions
         verbose (boolean): if True, retrieve all variables from API.
             Otherwise, only collect username and contributions (only relevant for contributors)
+        check_rate_limit (boolean): if True, check the remaining requests after retrieval.
+            Set to False if the caller checks the rate limit itself.
     Returns:
-        list: A list of the retrieved variables
+        list: A list of the retrieved variables, None if the retrieval failed
     """
-    retrieved_variables = []
-    request_successful = False
-    while not request_successful:
-        try:
-            if variable_type == "contributors":
-                retrieved_variables.extend(
-                    get_contributors(service, repo, verbose))
-            elif variable_type == "languages":
-                retrieved_variables.extend(get_languages(service, repo))
-            elif variable_type == "readmes":
-                retrieved_variables.extend(
-                    get_readmes(service, repo))
-            elif variable_type == "files":
-                retrieved_variables.extend(
-                    get_file_locations(service, repo, service.file_list))
-            elif variable_type == "tests":
-                retrieved_variables.extend(
-                    get_test_location(service, repo))
-            elif variable_type == "commits":
-                retrieved_variables.extend(
-                    get_commit_variables(service, repo))
-            elif variable_type == "versions":
-                retrieved_variables.extend(
-                    get_version_identifiability(service, repo))
-        except Exception as e:  # pylint: disable=broad-except
-            print(f"There was an error for repository {repo.url} : {e}")
-            # (non-existing repo)
-            if any(status_code in str(e) for status_code in ["204", "404"]):
-                print(f"Repository does not exist: {repo.url}")
-            elif "403" in str(e):  # timeout
-                # this does not use time until token refresh as sleep time
-                # due to the issue described in the print
-                print("Github seems to have issues with users that are accessing API data from"
-                      " an organization they are part of. It is not possible to distinguish"
-                      " between this error and a timeout issue. In case this is an issue for"
-                      " you, you can create a new Github account and generate a new token.")
-                print("Sleep for a while.")
-                for _ in range(100):
-                    time.sleep(6)
+    try:
+        retrieved_variables = retry_policy.call(get_variables, service, repo, variable_type,
+                                                verbose)
+    except Exception as e:  # pylint: disable=broad-except
+        print(f"There was an error for repository {repo.url} : {e}")
+        status = get_status(e)
+        # (non-existing repo)
+        if status in (204, 404):
+            print(f"Repository does not exist: {repo.url}")
+        elif status == 403:
+            # a 403 response of an exceeded rate limit is retried, other 403 responses are not
+            print("Github seems to have issues with users that are accessing API data from"
+                  " an organization they are part of. In case this is an issue for"
+                  " you, you can create a new Github account and generate a new token.")
+        else:
+            print(
+                f"Unhandled status code: {e} - skip repository"
+            )
+        return None
+    if check_rate_limit:
+        service.check_rate_limit()
+    return retrieved_variables
+
+
+def get_repos_from_dataframe(df_input):
+    """Bundles the repository columns of the input file into Repo objects
+
+    Args:
+        df_input (DataFrame): repositories with html_url, owner, name and default_branch
+            columns, and optionally the pushed_at column
+
+    Returns:
+        list: list of Repo objects in the order of the input file
+    """
+    if "default_branch" in df_input.columns:
+        branches = df_input["default_branch"]
+    else:
+        branches = ["main"] * len(df_input.index)
+    if "pushed_at" in df_input.columns:
+        pushes = df_input["pushed_at"].where(df_input["pushed_at"].notna(), None)
+    else:
+        pushes = [None] * len(df_input.index)
+    return [Repo(url, owner, repo_name, branch, pushed_at)
+            for url, owner, repo_name, branch, pushed_at in zip(
+                df_input["html_url"], df_input["owner"], df_input["name"], branches, pushes)]
+
+
+def get_repo_variables(service: Service, repo: Repo, variable_types, verbose=True):
+    """Retrieves several variable types for one repository in a single visit.
+    The rate limit is checked once per repository instead of once per variable type.
+
+    Args:
+        service (Service): Service object with API connection and metadata vars
+        repo    (Repo)   : Repository variables bundled together
+        variable_types (list): variable types that should be retrieved.
+                               See get_data_from_api for supported types.
+        verbose (boolean): passed on to get_data_from_api
+
+    Returns:
+        dict: retrieved variables per variable type. None if the retrieval failed.
+    """
+    retrieved_variables = {}
+    for variable_type in variable_types:
+        retrieved_variables[variable_type] = get_data_from_api(service, repo, variable_type,
+                                                               verbose, check_rate_limit=False)
+    service.check_rate_limit()
+    return retrieved_variables
+
+
+def get_pending_repos(repos, variable_types, exports=None):
+    """Returns the repositories and their variable types that were not processed before
+
+    Args:
+        repos (list): list of Repo objects
+        variable_types (list): variable types that should be retrieved
+        exports (dict): Optional. StreamingExport per variable type
+
+    Returns:
+        list: tuples of a Repo object and the variable types that should be retrieved
+    """
+    pending = []
+    for repo in repos:
+        repo_types = [variable_type for variable_type in variable_types
+                      if exports is None or not exports[variable_type].is_processed(repo.url)]
+        if repo_types:
+            pending.append((repo, repo_types))
+    if len(pending) < len(repos):
+        print(f"Skipping {len(repos) - len(pending)} repositories that were processed before.")
+    return pending
+
+
+def retrieve_repo_variables(service: Service, repos, variable_types, *, workers=1, verbose=True,
+                            exports=None):
+    """Retrieves variable types for a list of repositories, visiting each repository once.
+    Up to `workers` repositories are requested concurrently. All workers share the
+    rate limiter of the service.
+
+    Args:
+        service (Service): Service object with API connection and metadata vars
+        repos (list): list of Repo objects
+        variable_types (list): variable types that should be retrieved.
+                               See get_data_from_api for supported types.
+        workers (int): number of repositories that are processed concurrently
+        verbose (boolean): passed on to get_data_from_api
+        exports (dict): Optional. StreamingExport per variable type. If given, the variables
+                        of a repository are written as soon as they are retrieved instead of
+                        being returned, and repositories that were processed before the run
+                        was resumed are skipped.
+
+    Returns:
+        dict: retrieved variables of all repositories per variable type,
+              in the order of the input. Empty if exports are given.
+    """
+    retrieved_variables = {variable_type: [] for variable_type in variable_types}
+    pending = get_pending_repos(repos, variable_types, exports)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(partial(get_repo_variables, service, verbose=verbose),
+                               *zip(*pending)) if pending else []
+        for counter, ((repo, _), repo_variables) in enumerate(zip(pending, results)):
+            for variable_type, retrieved_data in repo_variables.items():
+                if retrieved_data is None:  # not recorded, so it is retried on resume
                     continue
-            else:
-                print(
-                    f"Unhandled status code: {e} - skip repository"
-                )
-            time.sleep(service.sleep)
-            return None
-        remaining_requests = service.api.rate_limit.get()["rate"]["remaining"]
-        print(f"Remaining GitHub requests: {remaining_requests}")
-
-        if remaining_requests < 5: # additional safety to not breach request limit
-            sleep_time = service.api.rate_limit.get()["rate"]["reset"] - int(time.time())
-            print(f"Reached request limit. Sleep for {sleep_time} seconds.")
-            time.sleep(sleep_time)
-        request_successful = True
-        time.sleep(service.sleep)
-        return retrieved_variables
+                if variable_type == "readmes":  # one readme entry per repository
+                    retrieved_data = [retrieved_data]
+                if exports is None:
+                    retrieved_variables[variable_type].extend(retrieved_data)
+                else:
+                    exports[variable_type].write(repo.url, retrieved_data)
+            if counter % 10 == 0:
+                print(f"Parsed {counter} out of {len(pending)} repos.")
+    return retrieved_variables
+
+
+def retrieve_variables(service: Service, repos, variable_type, workers=1, verbose=True):
+    """Retrieves one variable type for a list of repositories.
+
+    Args:
+        service (Service): Service object with API connection and metadata vars
+        repos (list): list of Repo objects
+        variable_type (string): which type of variable should be retrieved.
+                                See get_data_from_api for supported types.
+        workers (int): number of repositories that are processed concurrently
+        verbose (boolean): passed on to get_data_from_api
+
+    Returns:
+        list: retrieved variables of all repositories in the order of the input
+    """
+    return retrieve_repo_variables(service, repos, [variable_type],
+                                   workers=workers, verbose=verbose)[variable_type]
+
+
+def retrieve_graphql_variables(service: Service, repos, variable_types, batch_size=50):
+    """Retrieves variable types for a list of repositories with batched GraphQL queries
+    instead of one REST request per repository. The result has the same rows as the
+    REST retrieval. Supported are: languages, readmes, versions and topics.
+
+    Args:
+        service (Service): Service object with API connection and metadata vars
+        repos (list): list of Repo objects
+        variable_types (list): variable types that should be retrieved
+        batch_size (int): number of repositories per query
+
+    Returns:
+        dict: retrieved variables of all repositories per variable type,
+              in the order of the input
+    """
+    metadata = get_repositories(service.api, [(repo.owner, repo.repo_name) for repo in repos],
+                                batch_size, readmes="readmes" in variable_types)
+    retrieved_variables = {variable_type: [] for variable_type in variable_types}
+    for repo, repo_metadata in zip(repos, metadata):
+        if repo_metadata is None:
+            print(f"Repository does not exist: {repo.url}")
+            continue
+        if "languages" in variable_types:
+            retrieved_variables["languages"].extend(
+                [repo.url, language, num_chars]
+                for language, num_chars in repo_metadata["languages"])
+        if "readmes" in variable_types and repo_metadata["readme"] is not None:
+            retrieved_variables["readmes"].append([repo.url, repo_metadata["readme"]])
+        if "versions" in variable_types and repo_metadata["tags"]:
+            retrieved_variables["versions"].append(
+                [repo.url, check_version_scheme(repo_metadata["tags"])])
+        if "topics" in variable_types:
+            retrieved_variables["topics"].extend(
+                [repo.url, topic] for topic in repo_metadata["topics"])
+    return retrieved_variables
+
+
+def get_contributor_columns(service: Service):
+    """Retrieves the column names of the contributor variables from an arbitrary repository
+
+    Args:
+        service (Service): Service object with API connection and metadata vars
+
+    Returns:
+        list: column names of the contributor variables, None if they could not be retrieved
+    """
+    data = service.api.repos.list_contributors("kequach", "HTML-Examples")
+    if isinstance(data, L):
+        return ["html_url_repository"] + list(data[0].keys())
+    print("There was an error retrieving column names.")
+    return None
+
+
+# column names of the exported variables per variable type.
+# Contributor columns are retrieved from the API, see get_contributor_columns
+EXPORT_COLUMNS = {
+    "languages": ["html_url_repository", "language", "num_chars"],
+    "readmes": ["html_url_repository", "readme"],
+    "files": ["html_url_repository", "file_location"],
+    "tests": ["html_url_repository", "file_location"],
+    "commits": ["html_url_repository", "vcs_usage", "life_span",
+                "first_commit_user", "first_commit_date", "repo_active"],
+    "versions": ["html_url_repository", "version_identifiable"]
+}
+# variable types that can be retrieved with GraphQL, see retrieve_graphql_variables
+GRAPHQL_TYPES = ["languages", "readmes", "versions"]
+# names of the variable types used in the export messages
+EXPORT_NAMES = {
+    "contributors": "contributor",
+    "languages": "language",
+    "readmes": "readme",
+    "files": "files",
+    "tests": "tests",
+    "commits": "commits",
+    "versions": "version identifiability"
+}
 
 
 if __name__ == '__main__':
@@ -342,7 +721,6 @@ if __name__ == '__main__':
         SLEEP = 6
     else:
         SLEEP = 0
-    serv = Service(api=GhApi(token=token), sleep=SLEEP)
     # Initiate the parser
     parser = argparse.ArgumentParser()
 
@@ -362,6 +740,12 @@ if __name__ == '__main__':
                         help="Optional. Path for contributors output",
                         default="results/contributors.csv")
 
+    parser.add_argument("--contributors_users_output",
+                        "-cuout",
+                        help="Optional. Path for the unique users of the contributors. If set,"
+                             " the contributors output only holds the contributions per"
+                             " repository and the URL fields of the users are not stored.")
+
     parser.add_argument("--languages",
                         "-l",
                         action='store_true',
@@ -432,6 +816,62 @@ if __name__ == '__main__':
                         help="Optional. Path for version identifiability output",
                         default="results/versions.csv")
 
+    parser.add_argument("--workers",
+                        "-w",
+                        type=int,
+                        help="Optional. Number of repositories that are requested concurrently."
+                             " All workers share one rate limit budget.",
+                        default=1)
+
+    parser.add_argument("--tree_cache",
+                        "-tc",
+                        help="Optional. Directory in which retrieved git trees are cached on disk"
+                             " for file and test locations. By default, trees are only cached"
+                             " in memory during a run.")
+
+    parser.add_argument("--tree_cache_size",
+                        "-tcs",
+                        type=int,
+                        help="Optional. Maximum size of the git tree cache in megabytes.",
+                        default=256)
+
+    parser.add_argument("--cache",
+                        help="Optional. Directory for a persistent cache of GitHub API responses."
+                             " Cached responses are revalidated with conditional requests.")
+
+    parser.add_argument("--single_pass",
+                        "-sp",
+                        action='store_true',
+                        help="Set this flag to retrieve all requested variables in a single pass,"
+                             " visiting each repository once")
+
+    parser.add_argument("--resume",
+                        action='store_true',
+                        help="Set this flag to resume an interrupted run of today. Repositories"
+                             " that are already in the output are skipped.")
+
+    parser.add_argument("--previous_input",
+                        help="Optional. The repositories data of the previous run. Only"
+                             " repositories that are new or were pushed to since then are"
+                             " retrieved, the others are copied from the existing output.")
+
+    parser.add_argument("--full_commit_history",
+                        action='store_true',
+                        help="Set this flag to page through all commits for the commit variables"
+                             " instead of requesting the first and the last page only")
+
+    parser.add_argument("--graphql",
+                        "-gql",
+                        action='store_true',
+                        help="Set this flag to retrieve languages, readmes, versions and topics"
+                             " with batched GraphQL queries")
+
+    parser.add_argument("--graphql_batch_size",
+                        "-gqlbs",
+                        type=int,
+                        help="Optional. Number of repositories per GraphQL query (at most 100).",
+                        default=50)
+
     # Read arguments from the command line
     args = parser.parse_args()
     print(
@@ -445,143 +885,102 @@ if __name__ == '__main__':
           f"\nRetrieving commit variables? {args.commits}"
           f"\nRetrieving version variable? {args.versions}")
 
-    df_repos = read_input_file(args.input)
-
+    serv = Service(api=GitHubClient(token=token, cache_dir=args.cache,
+                                    limiter=RateLimiter(min_interval=SLEEP)),
+                   sleep=SLEEP)
+    serv.tree_cache = TreeCache(args.tree_cache, args.tree_cache_size * 1024 ** 2)
+    df_repos = read_table(args.input)
+    repositories = get_repos_from_dataframe(df_repos)
+    serv.file_list = args.files.split(",") if args.files else None
+    serv.full_commit_history = args.full_commit_history
+
+    requested = {"contributors": args.contributors,
+                 "languages": args.languages,
+                 "readmes": args.readmes,
+                 "files": bool(args.files),
+                 "tests": args.tests,
+                 "commits": args.commits,
+                 "versions": args.versions}
+    selected_types = [selected_type for selected_type, is_requested in requested.items()
+                      if is_requested]
+    outputs = {selected_type: getattr(args, f"{selected_type}_output")
+               for selected_type in selected_types}
+    export_columns = dict(EXPORT_COLUMNS)
     if args.contributors:
-        # get column names from arbitrary repo
-        data = serv.api.repos.list_contributors("kequach", "HTML-Examples")
-        if isinstance(data, L):
-            column_headers = list(data[0].keys())
-            all_column_headers = ["html_url_repository"] + column_headers
-            time.sleep(serv.sleep)
-        else:
-            print("There was an error retrieving column names.")
-        # get data
-        contributors_variables = []
-        for counter, (url, owner, repo_name) in enumerate(zip(df_repos["html_url"],
-                                                              df_repos["owner"], df_repos["name"])):
-            repository = Repo(url, owner, repo_name)
-            retrieved_data = get_data_from_api(
-                serv, repository, "contributors")
-            if retrieved_data is not None:
-                contributors_variables.extend(retrieved_data)
-            if counter % 10 == 0:
-                print(f"Parsed {counter} out of {len(df_repos.index)} repos.")
-
-        export_file(contributors_variables, all_column_headers, "contributor",
-                    args.contributors_output)
-
-    if args.languages:
-        # get languages
-        language_variables = []
-        for counter, (url, owner, repo_name) in enumerate(zip(df_repos["html_url"],
-                                                              df_repos["owner"], df_repos["name"])):
-            repository = Repo(url, owner, repo_name)
-            retrieved_data = get_data_from_api(serv, repository, "languages")
-            if retrieved_data is not None:
-                language_variables.extend(retrieved_data)
-            if counter % 10 == 0:
-                print(f"Parsed {counter} out of {len(df_repos.index)} repos.")
-
-        cols = ["html_url_repository", "language", "num_chars"]
-        export_file(language_variables, cols,
-                    "language", args.languages_output)
+        export_columns["contributors"] = get_contributor_columns(serv)
+
+    graphql_variables = {}
+    if args.graphql:
+        # languages, readmes, versions and topics of a batch of repositories are
+        # retrieved with one query, the other variable types with the REST API
+        graphql_types = [selected_type for selected_type in selected_types
+                         if selected_type in GRAPHQL_TYPES]
+        selected_types = [selected_type for selected_type in selected_types
+                          if selected_type not in GRAPHQL_TYPES]
+        if args.topics:
+            graphql_types.append("topics")
+        if graphql_types:
+            graphql_variables = retrieve_graphql_variables(serv, repositories, graphql_types,
+                                                           args.graphql_batch_size)
 
     if args.topics:
-        topics_variables = []
-        for (url, topics_str) in zip(df_repos["html_url"], df_repos["topics"]):
-            topics = ast.literal_eval(topics_str)
-            if len(topics) > 0:
-                for topic in topics:
-                    topic_entry = [url, topic]
-                    topics_variables.append(topic_entry)
+        if "topics" in graphql_variables:
+            topics_variables = graphql_variables.pop("topics")
+        else:
+            topics_variables = []
+            for (url, topics_str) in zip(df_repos["html_url"], df_repos["topics"]):
+                topics = ast.literal_eval(topics_str)
+                if len(topics) > 0:
+                    for topic in topics:
+                        topic_entry = [url, topic]
+                        topics_variables.append(topic_entry)
 
         export_file(topics_variables, ["html_url_repository", "topic"], "topic",
                     args.topics_output)
 
-    if args.readmes:
-        # get data
-        readmes_variables = []
-        for counter, (url, owner, repo_name) in enumerate(zip(df_repos["html_url"],
-                                                              df_repos["owner"], df_repos["name"])):
-            repository = Repo(url, owner, repo_name)
-            retrieved_data = get_data_from_api(serv, repository, "readmes")
-            print(retrieved_data)
-            if retrieved_data is not None:
-                readmes_variables.append(retrieved_data)
-            if counter % 10 == 0:
-                print(f"Parsed {counter} out of {len(df_repos.index)} repos.")
-
-        export_file(readmes_variables, ["html_url_repository", "readme"], "readme",
-                    args.readmes_output)
-
-    if args.files:
-        # get data
-        serv.file_list = args.files.split(",")
-        file_variables = []
-        for counter, (url, owner, repo_name,
-                      branch) in enumerate(zip(df_repos["html_url"], df_repos["owner"],
-                                               df_repos["name"], df_repos["default_branch"])):
-            repository = Repo(url, owner, repo_name, branch)
-            retrieved_data = get_data_from_api(serv, repository, "files")
-            print(retrieved_data)
-            if retrieved_data is not None:
-                file_variables.extend(retrieved_data)
-            if counter % 10 == 0:
-                print(f"Parsed {counter} out of {len(df_repos.index)} repos.")
-
-        export_file(file_variables, ["html_url_repository", "file_location"], "files",
-                    args.files_output)
-
-
-    if args.tests:
-        # get data
-        file_variables = []
-        for counter, (url, owner, repo_name,
-                      branch) in enumerate(zip(df_repos["html_url"], df_repos["owner"],
-                                               df_repos["name"], df_repos["default_branch"])):
-            repository = Repo(url, owner, repo_name, branch)
-            retrieved_data = get_data_from_api(serv, repository, "tests")
-            print(retrieved_data)
-            if retrieved_data is not None:
-                file_variables.extend(retrieved_data)
-            if counter % 10 == 0:
-                print(f"Parsed {counter} out of {len(df_repos.index)} repos.")
-
-        export_file(file_variables, ["html_url_repository", "file_location"], "tests",
-                    args.tests_output)
-
-
-    if args.commits:
-        # get data
-        commit_variables = []
-        for counter, (url, owner, repo_name) in enumerate(zip(df_repos["html_url"],
-                                                              df_repos["owner"], df_repos["name"])):
-            repository = Repo(url, owner, repo_name)
-            retrieved_data = get_data_from_api(serv, repository, "commits")
-            print(retrieved_data)
-            if retrieved_data is not None:
-                commit_variables.extend(retrieved_data)
-            if counter % 10 == 0:
-                print(f"Parsed {counter} out of {len(df_repos.index)} repos.")
-
-        export_file(commit_variables, ["html_url_repository", "vcs_usage", "life_span",
-                    "first_commit_user", "first_commit_date", "repo_active"],
-                    "commits", args.commits_output)
-
-
-    if args.versions:
-        # get data
-        version_variables = []
-        for counter, (url, owner, repo_name) in enumerate(zip(df_repos["html_url"],
-                                                              df_repos["owner"], df_repos["name"])):
-            repository = Repo(url, owner, repo_name)
-            retrieved_data = get_data_from_api(serv, repository, "versions")
-            print(retrieved_data)
-            if retrieved_data is not None:
-                version_variables.extend(retrieved_data)
-            if counter % 10 == 0:
-                print(f"Parsed {counter} out of {len(df_repos.index)} repos.")
-
-        export_file(version_variables, ["html_url_repository", "version_identifiable"],
-                    "version identifiability", args.versions_output)
+    for selected_type, type_variables in graphql_variables.items():
+        export_file(type_variables, export_columns[selected_type],
+                    EXPORT_NAMES[selected_type], outputs[selected_type])
+
+    previous_outputs = {}
+    if args.previous_input:
+        # unchanged repositories are carried forward from the existing output files
+        unchanged_repos = get_unchanged_repos(df_repos, read_table(args.previous_input))
+        print(f"{len(unchanged_repos)} out of {len(repositories)} repositories are unchanged"
+              " since the previous run.")
+        previous_outputs = {selected_type: select_rows(read_table(outputs[selected_type]),
+                                                       unchanged_repos)
+                            for selected_type in selected_types
+                            if os.path.exists(outputs[selected_type])}
+        if not previous_outputs.get("contributors", pd.DataFrame()).empty \
+                and args.contributors_users_output \
+                and os.path.exists(args.contributors_users_output):
+            # normalized contributors are joined with their users again
+            previous_outputs["contributors"] = join_contributors(
+                previous_outputs["contributors"], read_table(args.contributors_users_output)
+            ).reindex(columns=export_columns["contributors"] + ["date"])
+
+    # the variables are written per repository, so an interrupted run can be resumed
+    type_exports = {selected_type: StreamingExport(outputs[selected_type],
+                                                   export_columns[selected_type], args.resume)
+                    for selected_type in selected_types}
+    for selected_type, previous_rows in previous_outputs.items():
+        if not type_exports[selected_type].processed:  # not carried forward before resuming
+            type_exports[selected_type].carry_forward(previous_rows, unchanged_repos)
+    if args.single_pass:
+        # visit every repository once and retrieve all requested variable types
+        retrieve_repo_variables(serv, repositories, selected_types, workers=args.workers,
+                                exports=type_exports)
+    else:
+        for selected_type in selected_types:
+            retrieve_repo_variables(serv, repositories, [selected_type], workers=args.workers,
+                                    exports={selected_type: type_exports[selected_type]})
+    for selected_type in selected_types:
+        type_exports[selected_type].close(EXPORT_NAMES[selected_type])
+    if args.contributors and args.contributors_users_output:
+        # the repeated fields of the users are moved to a table of unique users
+        df_contributions, df_users = split_contributors(read_table(outputs["contributors"]))
+        write_table(df_contributions, outputs["contributors"], schema=CONTRIBUTOR_SCHEMA)
+        write_table(df_users, args.contributors_users_output, schema=CONTRIBUTOR_SCHEMA)
+        print(f"Saved {len(df_users.index)} unique contributors to"
+              f" {args.contributors_users_output}.")
@@ -2,15 +2,24 @@
 Retrieves howfairis variables for an input file of retrieved Github repositories.
 """
 import os
-import time
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from pathlib import Path
 import argparse
 
 from howfairis import Repo, Checker
-from ghapi.all import GhApi
 import pandas as pd
 from dotenv import load_dotenv
 
+# make the shared modules in the project root importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from swords.ratelimit import RateLimiter  # pylint: disable=wrong-import-position
+from swords.retry import RetryPolicy  # pylint: disable=wrong-import-position
+from swords.snapshot import get_unchanged_repos  # pylint: disable=wrong-import-position
+from swords.storage import read_table, write_table  # pylint: disable=wrong-import-position
+
 
 def get_howfairis_compliance(url_repo):
     """Retrieve howfairis compliance - see https://github.com/fair-software/howfairis
@@ -32,62 +41,151 @@ def get_howfairis_compliance(url_repo):
             compliance.citation, compliance.checklist)
 
 
-def read_input_file(file_path):
-    """reads in the input file through Pandas
+def parse_repo(repo_url):
+    """Parses a repository for howfairis variables. Temporary failures are retried
+    according to retry_policy, other failures (e.g. a deleted repository) are skipped.
 
     Args:
-        file_path (string): path to the file
+        repo_url (string): repository that should be parsed
 
     Returns:
-        DataFrame
+        list: a list with the repository url and the variables,
+              None if the repository could not be checked
     """
-    if "xlsx" in file_path:
-        file = pd.read_excel(file_path, engine='openpyxl')
-    else:
-        file = pd.read_csv(file_path)
-    return file
+    try:
+        compliance = retry_policy.call(get_howfairis_compliance, repo_url)
+    except Exception as e:  # pylint: disable=broad-except
+        print(f"Error occured for {repo_url}, skipping repository. Error message: {e}")
+        return None
+    entry = [repo_url, *compliance]
+    print(entry)
+    return entry
 
 
-def parse_repo(repo_url):
-    """Parses a repository for howfairis variables
+def parse_repos(repo_urls, workers=1):
+    """Parses repositories for howfairis variables. Up to `workers` repositories are
+    checked concurrently. All workers share the rate limiter.
 
     Args:
-        repo_url (string): repository that should be parsed
+        repo_urls (list): repositories that should be parsed
+        workers (int): number of repositories that are checked concurrently
 
     Returns:
-        list: a list with the repository url and the variables
+        list: results of parse_repo in the order of the input
     """
-    request_successful = False
-    while not request_successful:
-        try:
-            entry = [repo_url]
-            entry.extend(get_howfairis_compliance(repo_url))
-            print(entry)
-            time.sleep(1)
-            request_successful = True
-            return entry
-        except Exception as e: # pylint: disable=broad-except
-            print(f"Error occured for {repo_url} (most likely timeout issue due"
-                f" to API limitation. Sleep for a while. Error message: {e}")
-            if "Something went wrong asking the repo for its default branch" in str(
-                    e): # repo might be deleted
-                print("Skipping repository...")
-                request_successful = True  # skip this repo
-                return None
-            if "TimeoutError" in str(e):
-                time.sleep(5)
-            else:
-                sleep_time = api.rate_limit.get()["rate"]["reset"] - int(time.time())
-                time.sleep(sleep_time + 2)
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for counter, result in enumerate(executor.map(parse_repo, repo_urls)):
+            results.append(result)
+            if counter % 10 == 0:
+                print(f"Parsed {counter} out of {len(repo_urls)} repos.")
+    return results
+
+# badges in the readme that howfairis accepts per recommendation, see
+# https://github.com/fair-software/howfairis/tree/main/howfairis/mixins
+REGISTRY_BADGES = re.compile("|".join([
+    r"https://img\.shields\.io/badge/ascl.*",
+    r"https://api\.bintray\.com/packages/.*/.*/.*/images/download\.svg",
+    r"https://img\.shields\.io/bintray/.*",
+    r"https://anaconda\.org/.*/.*/badges/(downloads|latest_release_date"
+    r"|latest_release_relative_date|platforms|version)\.svg",
+    r"https://anaconda\.org/.*/.*/badges/installer/conda\.svg",
+    r"https://img\.shields\.io/conda/.*",
+    r"https://cranlogs\.r-pkg\.org/badges/.*",
+    r"https://www\.r-pkg\.org/badges/.*",
+    r"https://img\.shields\.io/cran/.*",
+    r"https://badgen.net/crates/v/.*",
+    r"https://img\.shields\.io/crates/.*",
+    r"https://badgen.net/maven/v/maven-central/.*",
+    r"https://img\.shields\.io/maven-central/.*",
+    r"https://img\.shields\.io/maven-metadata/.*",
+    r"https://badge.fury.io/js/.*",
+    r"https://badgen.net/npm/v/.*",
+    r"https://img\.shields\.io/npm/.*",
+    r"https://pypi\.python\.org/pypi/",
+    r"https://badge\.fury\.io/py/.*\.svg",
+    r"https://badgen\.net/pypi/v/.*",
+    r"https://img\.shields\.io/pypi/.*",
+    r"https://img\.shields\.io/badge/(RSD|rsd)-.*",
+]))
+CITATION_BADGES = re.compile(r"https://zenodo\.org/badge/DOI/10\.5281/zenodo\.[0-9]*\.svg"
+                             r"|https://zenodo\.org/badge/[0-9]*\.svg")
+CHECKLIST_BADGES = re.compile(
+    r"https://bestpractices\.coreinfrastructure\.org/projects/[0-9]*/badge")
+# files in the root of a repository that make the software citable
+CITATION_FILES = {"CITATION", "CITATION.cff", "codemeta.json", ".zenodo.json"}
+# badges in comments are ignored, as in the default configuration of howfairis
+COMMENT_PATTERN = re.compile(r"<!--.*?-->", re.DOTALL)
+
+
+def get_offline_compliance(license_name, readme, file_paths):
+    """Computes the howfairis compliance from data that was already collected, without
+    sending requests. The checks of howfairis are applied to the license of the
+    repository listing, the readme and the file paths of the repository.
+
+    Args:
+        license_name (string): license of the repository listing, missing if there is none
+        readme (string): readme text, missing if there is none
+        file_paths (set): paths of the files of the repository. Only the citation
+                          files are needed, see CITATION_FILES
+    Returns:
+        repository (bool): Whether repository is publicly accessible with version control
+        license (bool): Whether repository has a license
+        registry (bool): Whether code is in a registry
+        citation (bool): Whether software is citable
+        checklist (bool): Whether a software quality checklist is used
+    """
+    readme = COMMENT_PATTERN.sub("", readme) if isinstance(readme, str) else ""
+    has_license = isinstance(license_name, str) and license_name != ""
+    citation = (not CITATION_FILES.isdisjoint(file_paths)
+                or CITATION_BADGES.search(readme) is not None)
+    # listed repositories are public
+    return (True, has_license, REGISTRY_BADGES.search(readme) is not None, citation,
+            CHECKLIST_BADGES.search(readme) is not None)
 
-# if unauthorized API is used, rate limit is lower,
-# leading to a ban and waiting time needs to be increased
+
+def get_offline_variables(df_repositories, df_readmes, df_files):
+    """Computes the howfairis variables of repositories from collected data,
+    see get_offline_compliance
+
+    Args:
+        df_repositories (DataFrame): repositories with the columns html_url and license
+        df_readmes (DataFrame): readmes retrieved by github.py
+        df_files (DataFrame): file locations retrieved by github.py
+
+    Returns:
+        list: per repository a list with the repository url and the variables
+    """
+    readmes = dict(zip(df_readmes["html_url_repository"], df_readmes["readme"]))
+    file_paths = df_files.groupby("html_url_repository")["file_location"].agg(set)
+    return [[url, *get_offline_compliance(license_name, readmes.get(url),
+                                          file_paths.get(url, set()))]
+            for url, license_name in zip(df_repositories["html_url"], df_repositories["license"])]
+
+def has_citation_files(df_files):
+    """Returns whether any of the file locations is a citation file, see CITATION_FILES.
+    If not, the file locations were most likely retrieved without the citation files as
+    search terms, and the citation check can only find Zenodo badges.
+
+    Args:
+        df_files (DataFrame): file locations retrieved by github.py
+
+    Returns:
+        bool: whether a citation file was found in any repository
+    """
+    return not CITATION_FILES.isdisjoint(df_files["file_location"])
+
+# howfairis sends its own requests, so these are paced by the limiter at one
+# check per second at most, also if several checks run concurrently. If the rate
+# limit is reached, the retry policy pauses all checks until the reset time reported
+# by the API. A failed check is retried at most four times.
 # see: https://github.com/fair-software/howfairis/#rate-limit
 load_dotenv()
 token = os.getenv('GITHUB_TOKEN')
 user = os.getenv('GITHUB_USER')
 
-api = GhApi(token=token)
+limiter = RateLimiter(min_interval=1)
+retry_policy = RetryPolicy(limiter=limiter)
 if token is not None and user is not None:
     os.environ['APIKEY_GITHUB'] = user + ":" + token
 
@@ -105,32 +203,85 @@ if __name__ == '__main__':
                         "-o",
                         help="The file name of the filtered repositories.",
                         default="results/howfairis.csv")
+    parser.add_argument("--previous_input",
+                        help="Optional. The repositories data of the previous run. Only"
+                             " repositories that are new or were pushed to since then are"
+                             " checked, the others are copied from the existing output.")
+    parser.add_argument("--workers",
+                        "-w",
+                        type=int,
+                        help="Optional. Number of repositories that are checked concurrently."
+                             " All workers share one rate limit.",
+                        default=1)
+    parser.add_argument("--offline",
+                        action='store_true',
+                        help="Set this flag to compute the variables from the license of the"
+                             " repositories and the readmes and files retrieved by github.py,"
+                             " without sending requests")
+    parser.add_argument("--readmes_input",
+                        help="Optional. Readmes retrieved by github.py, used with --offline.",
+                        default="results/readmes.csv")
+    parser.add_argument("--files_input",
+                        help="Optional. File locations retrieved by github.py, used with"
+                             " --offline.",
+                        default="results/files.csv")
 
     # Read arguments from the command line
     args = parser.parse_args()
     print(f"Retrieving howfairis variables for the following file: {args.input}")
+    current_date = datetime.today().strftime('%Y-%m-%d')
 
+    if args.offline:
+        df_repos = read_table(args.input, columns=["html_url", "license"])
+        collected = {}
+        for name, path, columns in [("readmes", args.readmes_input, ["readme"]),
+                                    ("files", args.files_input, ["file_location"])]:
+            columns = ["html_url_repository"] + columns
+            if os.path.exists(path):
+                collected[name] = read_table(path, columns=columns)
+            else:
+                print(f"No {name} found at {path}. Checks that need them will be False.")
+                collected[name] = pd.DataFrame(columns=columns)
+        if not has_citation_files(collected["files"]):
+            print("Warning: none of the file locations is a citation file, so the citation"
+                  " files were most likely not searched. howfairis_citation is only True for"
+                  " repositories with a Zenodo badge. Retrieve the file locations with"
+                  ' github.py --files "CITATION,codemeta.json,.zenodo.json" first.')
+        howfairis_variables = [row + [current_date] for row in get_offline_variables(
+            df_repos, collected["readmes"], collected["files"])]
+    else:
+        # only the columns that are used are read
+        repo_columns = ["html_url", "pushed_at"] if args.previous_input else ["html_url"]
+        df_repos = read_table(args.input, columns=repo_columns)
+        howfairis_variables = []
 
-    df_repos = read_input_file(args.input)
-    howfairis_variables = []
+        previous_variables = {}
+        if args.previous_input and os.path.exists(args.output):
+            unchanged_repos = get_unchanged_repos(df_repos, read_table(args.previous_input,
+                                                                      columns=repo_columns))
+            previous_variables = {row[0]: row for row
+                                  in read_table(args.output).values.tolist()
+                                  if row[0] in unchanged_repos}
+            print(f"{len(previous_variables)} out of {len(df_repos.index)} repositories are"
+                  " unchanged since the previous run.")
 
-    for counter, url in enumerate(df_repos["html_url"]):
-        result = parse_repo(url)
-        if result is not None: # If repo is deleted it is None
-            howfairis_variables.append(result)
-        if counter % 10 == 0:
-            print(f"Parsed {counter} out of {len(df_repos.index)} repos.")
+        pending_urls = [url for url in df_repos["html_url"] if url not in previous_variables]
+        parsed_repos = dict(zip(pending_urls, parse_repos(pending_urls, args.workers)))
+
+        for url in df_repos["html_url"]:
+            if url in previous_variables:  # carry forward with the date of the previous run
+                howfairis_variables.append(previous_variables[url])
+            elif parsed_repos[url] is not None:  # If repo is deleted it is None
+                howfairis_variables.append(parsed_repos[url] + [current_date])
 
     df_howfairis = pd.DataFrame(howfairis_variables,
                                 columns=[
                                     "html_url", "howfairis_repository",
                                     "howfairis_license", "howfairis_registry",
-                                    "howfairis_citation", "howfairis_checklist"
+                                    "howfairis_citation", "howfairis_checklist", "date"
                                 ])
 
-    current_date = datetime.today().strftime('%Y-%m-%d')
-    df_howfairis["date"] = current_date
-    df_howfairis.to_csv(args.output, index=False)
+    write_table(df_howfairis, args.output)
 
     print(
         f"Successfully retrieved howfairis variables for {len(df_howfairis.index)}"
@@ -2,26 +2,21 @@
 This file parses an input readme file for related FAIR variables.
 """
 import re
+import sys
 from datetime import datetime
+from pathlib import Path
 import argparse
 
 import pandas as pd
 
+# make the shared modules in the project root importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from swords.storage import iter_table, write_table  # pylint: disable=wrong-import-position
 
-def read_input_file(file_path):
-    """reads in the input file through Pandas
-
-    Args:
-        file_path (string): path to the file
-
-    Returns:
-        DataFrame
-    """
-    if "xlsx" in file_path:
-        input_file = pd.read_excel(file_path, engine='openpyxl')
-    else:
-        input_file = pd.read_csv(file_path)
-    return input_file
+# patterns of the readme variables, compiled once for all readmes
+INSTALL_PATTERN = re.compile("install|docker")
+USAGE_PATTERN = re.compile("usage|getting started|quick start|example|tutorial")
+CONTRIB_PATTERN = re.compile("contribut")
 
 
 if __name__ == '__main__':
@@ -45,15 +40,15 @@ if __name__ == '__main__':
         f"Retrieving readme variables for the following file: {args.input}")
 
 
-    df_repos = read_input_file(args.input)
-    df_repos = df_repos.dropna()
     results = []
-    for url, readme in zip(df_repos["html_url_repository"], df_repos["readme"]):
-        install_instruction = bool(re.search("install|docker", readme))
-        usage_example = bool(re.search("usage|getting started|quick start|example|tutorial",
-                                       readme))
-        contrib_guidelines = bool(re.search("contribut", readme))
-        results.append([url, install_instruction, usage_example, contrib_guidelines])
+    # the readmes are read in chunks, so only a part of them is held in memory
+    for df_repos in iter_table(args.input, columns=["html_url_repository", "readme"]):
+        df_repos = df_repos.dropna()
+        for url, readme in zip(df_repos["html_url_repository"], df_repos["readme"]):
+            install_instruction = bool(INSTALL_PATTERN.search(readme))
+            usage_example = bool(USAGE_PATTERN.search(readme))
+            contrib_guidelines = bool(CONTRIB_PATTERN.search(readme))
+            results.append([url, install_instruction, usage_example, contrib_guidelines])
     print(results)
 
     df_results = pd.DataFrame(results,
@@ -68,7 +63,7 @@ if __name__ == '__main__':
 
     current_date = datetime.today().strftime('%Y-%m-%d')
     df_results["date"] = current_date
-    df_results.to_csv(args.output, index=False)
+    write_table(df_results, args.output)
 
     print(
         f"Successfully retrieved readme variables. Saved result to {args.output}."
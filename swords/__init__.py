@@ -0,0 +1,3 @@
+"""
+Shared modules used by the scripts of the SWORDS pipeline phases.
+"""
@@ -0,0 +1,50 @@
+"""
+Normalized storage of the contributors of repositories. The GitHub API returns about
+twenty fields per contributor, most of them URLs that are derived from the login. The
+contributors are stored as a table of contributions per repository and a table of
+unique users, which can be joined on the user id.
+"""
+
+# columns of the contributions, one row per contributor of a repository.
+# The login is kept, so the contributions can be joined with the collected users
+CONTRIBUTION_COLUMNS = ["html_url_repository", "login", "id", "contributions", "date"]
+# columns of the unique users. The URL fields of the API are not stored,
+# as they can be derived from the login
+USER_COLUMNS = ["id", "login", "node_id", "type", "site_admin", "date"]
+# types of the columns of both tables
+CONTRIBUTOR_SCHEMA = {"id": "Int64", "contributions": "Int64", "site_admin": "boolean"}
+
+
+def split_contributors(df_contributors):
+    """Splits the contributors as retrieved from the GitHub API into a table of
+    contributions and a table of unique users. If a user occurs more than once,
+    the most recent row is kept.
+
+    Args:
+        df_contributors (DataFrame): contributors with the fields of the GitHub API
+
+    Returns:
+        tuple: DataFrame of the contributions and DataFrame of the users
+    """
+    df_contributions = df_contributors[[column for column in CONTRIBUTION_COLUMNS
+                                        if column in df_contributors.columns]]
+    df_users = df_contributors[[column for column in USER_COLUMNS
+                                if column in df_contributors.columns]]
+    df_users = df_users.dropna(subset=["id"]).drop_duplicates("id", keep="last")
+    return df_contributions.reset_index(drop=True), df_users.reset_index(drop=True)
+
+
+def join_contributors(df_contributions, df_users):
+    """Joins contributions with the users they belong to, the inverse of split_contributors.
+    The URL fields of the GitHub API are not restored.
+
+    Args:
+        df_contributions (DataFrame): contributions, see CONTRIBUTION_COLUMNS
+        df_users (DataFrame): users, see USER_COLUMNS
+
+    Returns:
+        DataFrame: contributors in the order of the contributions
+    """
+    user_fields = [column for column in df_users.columns
+                   if column not in df_contributions.columns or column == "id"]
+    return df_contributions.merge(df_users[user_fields], on="id", how="left")
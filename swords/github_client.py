@@ -0,0 +1,87 @@
+"""
+GhApi client shared by the pipeline scripts.
+"""
+import threading
+from urllib.error import HTTPError
+
+from fastcore.xtras import dict2obj, obj2dict
+from ghapi.all import GhApi
+
+from swords.http_cache import ResponseCache
+
+
+class GitHubClient(GhApi):
+    """
+    GhApi client with an optional rate limiter and persistent response cache.
+
+    If a rate limiter is given, every request waits for the limiter and the rate limit
+    headers of every response, including error responses, are passed on to it.
+
+    If a cache directory is given, GET responses are stored with their ETag and
+    Last-Modified headers. Later requests for the same endpoint are sent as
+    conditional requests. GitHub answers unchanged resources with 304 Not Modified,
+    which does not count against the rate limit, and the cached response is returned.
+    The headers of the most recent response (`recv_hdrs`) are kept per thread,
+    so one client can be shared by concurrent workers.
+
+    cache_dir (string): Optional. Directory of the response cache.
+    limiter (RateLimiter): Optional. Rate limiter that paces the requests.
+    Other arguments are passed on to GhApi.
+    """
+
+    # responses of these endpoints change with every request
+    uncached_paths = ("/rate_limit",)
+
+    def __init__(self, *args, cache_dir=None, limiter=None, **kwargs):
+        self.local = threading.local()
+        super().__init__(*args, **kwargs)
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        self.limiter = limiter
+
+    @property
+    def recv_hdrs(self):
+        """Headers of the most recent response of the current thread"""
+        return getattr(self.local, "recv_hdrs", {})
+
+    @recv_hdrs.setter
+    def recv_hdrs(self, headers):
+        self.local.recv_hdrs = headers
+
+    # the signature of GhApi.__call__ is kept, as GhApi callers may pass the options by position
+    def __call__(self, path: str, verb: str = None, headers: dict = None, route: dict = None,  # pylint: disable=too-many-positional-arguments
+                 query: dict = None, data=None):
+        if self.limiter is not None:
+            self.limiter.acquire()
+        try:
+            result = self.send(path, verb, headers=headers, route=route, query=query, data=data)
+        except HTTPError as e:
+            if self.limiter is not None:
+                self.limiter.update(e.headers)
+            raise
+        if self.limiter is not None:
+            self.limiter.update(self.recv_hdrs)
+        return result
+
+    def send(self, path, verb=None, *, headers=None, route=None, query=None, data=None):
+        """Sends a request, as a conditional request if the response is cached"""
+        verb = verb or ("POST" if data else "GET")
+        accept = {**self.headers, **(headers or {})}["Accept"]
+        if (self.cache is None or verb.upper() != "GET" or "json" not in accept
+                or path.endswith(self.uncached_paths)):
+            return super().__call__(path, verb, headers=headers, route=route, query=query,
+                                    data=data)
+
+        key = self.cache.get_key(path, route, query, accept)
+        entry = self.cache.get(key)
+        if entry is not None:
+            headers = {**(headers or {}), **self.cache.get_validators(entry)}
+        try:
+            result = super().__call__(path, verb, headers=headers, route=route, query=query,
+                                    data=data)
+        except HTTPError as e:
+            if e.code != 304 or entry is None:
+                raise
+            self.recv_hdrs = {**entry["headers"], **dict(e.headers)}
+            return dict2obj(entry["body"])
+        self.cache.put(key, obj2dict(result), self.recv_hdrs)
+        return result
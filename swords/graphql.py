@@ -0,0 +1,331 @@
+"""
+Batched GraphQL queries for repository and user metadata.
+"""
+from urllib.error import HTTPError
+
+# fields retrieved for every repository of a batch
+REPOSITORY_FIELDS = """
+    url
+    defaultBranchRef { name }
+    licenseInfo { name }
+    repositoryTopics(first: 100) { nodes { topic { name } } }
+    languages(first: 100, orderBy: {field: SIZE, direction: DESC}) {
+      edges { size node { name } }
+    }
+    refs(refPrefix: "refs/tags/", first: 100) { nodes { name } }
+    readmeGithub: object(expression: "HEAD:.github") { ...entries }
+    readmeRoot: object(expression: "HEAD:") { ...entries }
+    readmeDocs: object(expression: "HEAD:docs") { ...entries }
+"""
+
+ENTRIES_FRAGMENT = """
+fragment entries on Tree { entries { name type } }
+"""
+
+# folders that are searched for a readme, in the order of precedence of GitHub
+README_FOLDERS = {"readmeGithub": ".github/", "readmeRoot": "", "readmeDocs": "docs/"}
+
+
+def build_repository_query(num_repos):
+    """Builds a query that retrieves the metadata of several repositories at once.
+    Every repository gets an alias r0, r1, ... and the variables o0, n0, o1, n1, ...
+    for its owner and name.
+
+    Args:
+        num_repos (int): number of repositories in the query
+
+    Returns:
+        string: GraphQL query
+    """
+    variables = ", ".join(f"$o{i}: String!, $n{i}: String!" for i in range(num_repos))
+    aliases = "\n".join(f"  r{i}: repository(owner: $o{i}, name: $n{i}) {{{REPOSITORY_FIELDS}}}"
+                        for i in range(num_repos))
+    return f"query({variables}) {{\n{aliases}\n}}\n{ENTRIES_FRAGMENT}"
+
+
+def build_blob_query(num_blobs):
+    """Builds a query that retrieves the text of several files at once.
+
+    Args:
+        num_blobs (int): number of files in the query
+
+    Returns:
+        string: GraphQL query
+    """
+    variables = ", ".join(f"$o{i}: String!, $n{i}: String!, $e{i}: String!"
+                          for i in range(num_blobs))
+    aliases = "\n".join(f"  r{i}: repository(owner: $o{i}, name: $n{i}) "
+                        f"{{ object(expression: $e{i}) {{ ... on Blob {{ text }} }} }}"
+                        for i in range(num_blobs))
+    return f"query({variables}) {{\n{aliases}\n}}"
+
+
+def run_query(api, query, variables):
+    """Sends a GraphQL query. Repositories that could not be resolved,
+    for example because they do not exist anymore, are None in the result.
+
+    Args:
+        api (GhApi): GhApi client
+        query (string): GraphQL query
+        variables (dict): variables of the query
+
+    Returns:
+        dict: data of the query per alias
+    """
+    result = api("/graphql", "POST", data={"query": query, "variables": variables})
+    if result.get("data") is None:
+        raise ValueError(f"GraphQL query failed: {result.get('errors')}")
+    return result["data"]
+
+
+def get_readme_path(node):
+    """Returns the path of the readme of a repository, following the folder precedence
+    of GitHub. A README.md is preferred over other readme formats in the same folder.
+
+    Args:
+        node (dict): repository node of the metadata query
+
+    Returns:
+        string: path of the readme, None if there is no readme
+    """
+    for alias, folder in README_FOLDERS.items():
+        tree = node.get(alias) or {}
+        names = [entry["name"] for entry in tree.get("entries") or []
+                 if entry["type"] == "blob" and entry["name"].lower().split(".")[0] == "readme"]
+        if names:
+            preferred = [name for name in names if name.lower() == "readme.md"]
+            return folder + (preferred or names)[0]
+    return None
+
+
+def format_repository(node):
+    """Flattens a repository node of the metadata query
+
+    Args:
+        node (dict): repository node of the metadata query
+
+    Returns:
+        dict: url, default_branch, license, topics, languages (list of name and size),
+              tags and readme_path of the repository
+    """
+    return {
+        "url": node["url"],
+        "default_branch": (node.get("defaultBranchRef") or {}).get("name"),
+        "license": (node.get("licenseInfo") or {}).get("name"),
+        "topics": [topic["topic"]["name"] for topic in node["repositoryTopics"]["nodes"]],
+        "languages": [(edge["node"]["name"], edge["size"])
+                      for edge in node["languages"]["edges"]],
+        "tags": [tag["name"] for tag in node["refs"]["nodes"]],
+        "readme_path": get_readme_path(node),
+    }
+
+
+def get_batch(api, batch, readmes=True):
+    """Retrieves the metadata of one batch of repositories. If GitHub fails to answer
+    the query in time, the batch is split in halves that are retrieved separately.
+
+    Args:
+        api (GhApi): GhApi client
+        batch (list): tuples of owner and name of the repositories
+        readmes (boolean): if True, retrieve the readme texts with a second query
+
+    Returns:
+        list: metadata per repository, see format_repository. None for repositories
+              that could not be resolved.
+    """
+    variables = {}
+    for i, (owner, name) in enumerate(batch):
+        variables[f"o{i}"], variables[f"n{i}"] = owner, name
+    try:
+        data = run_query(api, build_repository_query(len(batch)), variables)
+    except HTTPError as e:
+        if e.code not in (502, 504) or len(batch) == 1:
+            raise
+        half = len(batch) // 2
+        return get_batch(api, batch[:half], readmes) + get_batch(api, batch[half:], readmes)
+    result = [format_repository(data[f"r{i}"]) if data.get(f"r{i}") else None
+              for i in range(len(batch))]
+    if readmes:
+        add_readmes(api, batch, result)
+    return result
+
+
+def add_readmes(api, batch, result):
+    """Retrieves the readme texts of a batch of repositories with one query and adds
+    them to the metadata under the key readme. The readme is None if the repository
+    has no readme or if it is a binary file.
+
+    Args:
+        api (GhApi): GhApi client
+        batch (list): tuples of owner and name of the repositories
+        result (list): metadata per repository of the batch, see format_repository
+    """
+    with_readme = [i for i, repo in enumerate(result)
+                   if repo is not None and repo["readme_path"] is not None]
+    variables = {}
+    for j, i in enumerate(with_readme):
+        variables[f"o{j}"], variables[f"n{j}"] = batch[i]
+        variables[f"e{j}"] = f"HEAD:{result[i]['readme_path']}"
+    blobs = run_query(api, build_blob_query(len(with_readme)), variables) if with_readme else {}
+    for repo in result:
+        if repo is not None:
+            repo["readme"] = None
+    for j, i in enumerate(with_readme):
+        blob = (blobs.get(f"r{j}") or {}).get("object") or {}
+        result[i]["readme"] = blob.get("text")
+
+
+def get_repositories(api, repos, batch_size=50, readmes=True):
+    """Retrieves languages, topics, license, default branch, tags and readme of
+    repositories with batched GraphQL queries. A batch of repositories costs one
+    query, plus one query for the readme texts.
+
+    Args:
+        api (GhApi): GhApi client
+        repos (list): tuples of owner and name of the repositories
+        batch_size (int): number of repositories per query. GitHub allows at most 100.
+        readmes (boolean): if True, retrieve the readme texts
+
+    Returns:
+        list: metadata per repository in the order of the input, see format_repository.
+              None for repositories that could not be resolved.
+    """
+    result = []
+    for start in range(0, len(repos), batch_size):
+        result.extend(get_batch(api, repos[start:start + batch_size], readmes))
+        print(f"Retrieved {min(start + batch_size, len(repos))} out of {len(repos)}"
+              " repositories with GraphQL.")
+    return result
+
+
+# fields retrieved for every user of a batch. Users and organizations are both
+# repository owners, as the users endpoint of the REST API returns both
+USER_FIELDS = """
+    __typename
+    login
+    id
+    avatarUrl
+    url
+    ... on User {
+      databaseId name company websiteUrl location email isHireable bio twitterUsername
+      isSiteAdmin createdAt updatedAt
+      repositories(privacy: PUBLIC, ownerAffiliations: OWNER) { totalCount }
+      gists(privacy: PUBLIC) { totalCount }
+      followers { totalCount }
+      following { totalCount }
+    }
+    ... on Organization {
+      databaseId name websiteUrl location email twitterUsername createdAt updatedAt
+      repositories(privacy: PUBLIC, ownerAffiliations: OWNER) { totalCount }
+    }
+"""
+
+# URL fields of the REST API that are derived from the login of a user
+USER_URLS = {
+    "followers_url": "/followers",
+    "following_url": "/following{/other_user}",
+    "gists_url": "/gists{/gist_id}",
+    "starred_url": "/starred{/owner}{/repo}",
+    "subscriptions_url": "/subscriptions",
+    "organizations_url": "/orgs",
+    "repos_url": "/repos",
+    "events_url": "/events{/privacy}",
+    "received_events_url": "/received_events",
+}
+
+
+def build_user_query(num_users):
+    """Builds a query that retrieves several users at once. Every user gets an
+    alias u0, u1, ... and the variable l0, l1, ... for its login.
+
+    Args:
+        num_users (int): number of users in the query
+
+    Returns:
+        string: GraphQL query
+    """
+    variables = ", ".join(f"$l{i}: String!" for i in range(num_users))
+    aliases = "\n".join(f"  u{i}: repositoryOwner(login: $l{i}) {{{USER_FIELDS}}}"
+                        for i in range(num_users))
+    return f"query({variables}) {{\n{aliases}\n}}"
+
+
+def format_user(node):
+    """Maps a user node to the fields of the users endpoint of the REST API,
+    in the same order. Fields that only exist for users are empty or zero for
+    organizations, as in the REST API.
+
+    Args:
+        node (dict): user node of the user query
+
+    Returns:
+        dict: user with the fields of the REST API
+    """
+    api_url = f"https://api.github.com/users/{node['login']}"
+    user = {"login": node["login"], "id": node.get("databaseId"), "node_id": node["id"],
+            "avatar_url": node["avatarUrl"], "gravatar_id": "", "url": api_url,
+            "html_url": node["url"]}
+    user.update({field: api_url + path for field, path in USER_URLS.items()})
+    user.update({
+        "type": node["__typename"],
+        "site_admin": node.get("isSiteAdmin", False),
+        "name": node.get("name"),
+        "company": node.get("company"),
+        "blog": node.get("websiteUrl") or "",
+        "location": node.get("location"),
+        "email": node.get("email") or None,  # GraphQL returns "" for private emails
+        "hireable": node.get("isHireable") or None,
+        "bio": node.get("bio"),
+        "twitter_username": node.get("twitterUsername"),
+        "public_repos": (node.get("repositories") or {}).get("totalCount", 0),
+        "public_gists": (node.get("gists") or {}).get("totalCount", 0),
+        "followers": (node.get("followers") or {}).get("totalCount", 0),
+        "following": (node.get("following") or {}).get("totalCount", 0),
+        "created_at": node.get("createdAt"),
+        "updated_at": node.get("updatedAt"),
+    })
+    return user
+
+
+def get_user_batch(api, batch):
+    """Retrieves one batch of users. If GitHub fails to answer the query in time,
+    the batch is split in halves that are retrieved separately.
+
+    Args:
+        api (GhApi): GhApi client
+        batch (list): logins of the users
+
+    Returns:
+        list: users with the fields of the REST API, see format_user. None for
+              users that could not be resolved.
+    """
+    variables = {f"l{i}": login for i, login in enumerate(batch)}
+    try:
+        data = run_query(api, build_user_query(len(batch)), variables)
+    except HTTPError as e:
+        if e.code not in (502, 504) or len(batch) == 1:
+            raise
+        half = len(batch) // 2
+        return get_user_batch(api, batch[:half]) + get_user_batch(api, batch[half:])
+    return [format_user(data[f"u{i}"]) if data.get(f"u{i}") else None
+            for i in range(len(batch))]
+
+
+def get_users(api, logins, batch_size=50):
+    """Retrieves users with batched GraphQL queries. A batch of users costs one query.
+
+    Args:
+        api (GhApi): GhApi client
+        logins (list): logins of the users
+        batch_size (int): number of users per query. GitHub allows at most 100.
+
+    Returns:
+        list: users in the order of the input, see format_user. None for users
+              that could not be resolved.
+    """
+    result = []
+    for start in range(0, len(logins), batch_size):
+        result.extend(get_user_batch(api, logins[start:start + batch_size]))
+        print(f"Retrieved {min(start + batch_size, len(logins))} out of {len(logins)}"
+              " users with GraphQL.")
+    return result
@@ -0,0 +1,43 @@
+"""
+Extraction of GitHub user names from free text, such as profile pages, CVs and
+research output. The text is scanned once with a precompiled regular expression.
+"""
+import re
+
+# GitHub user names consist of alphanumeric characters and single hyphens,
+# with at most 39 characters
+HANDLE = r"[a-z0-9](?:[a-z0-9]|-(?=[a-z0-9])){0,38}"
+# profile urls (github.com/<user>, also via www and gist) and GitHub Pages
+# (<user>.github.io). The lookarounds make sure that the host is not part of a
+# longer host name and that a name is matched completely, not only its beginning
+HANDLE_PATTERN = re.compile(
+    rf"(?<![\w.-])(?:www\.|gist\.)?github\.com/(?:orgs/)?({HANDLE})(?![\w-])"
+    rf"|(?<![\w.-])({HANDLE})\.github\.io(?![\w-])",
+    re.IGNORECASE)
+# paths of github.com that are not user names
+RESERVED_NAMES = {
+    "about", "apps", "collections", "contact", "customer-stories", "enterprise", "events",
+    "explore", "features", "login", "marketplace", "new", "notifications", "orgs",
+    "pricing", "pulls", "issues", "search", "security", "settings", "site", "sponsors",
+    "team", "topics", "trending",
+}
+
+
+def find_github_handles(text):
+    """Finds the GitHub user names in a text. Names are taken from profile urls
+    (github.com/<user>, with or without scheme) and from GitHub Pages urls
+    (<user>.github.io). Urls of GitHub itself, such as github.com/features, are ignored.
+
+    Args:
+        text (string): text to be searched, e.g. a CV in HTML
+
+    Returns:
+        list: user names in the order of their first occurrence, without duplicates.
+              GitHub Pages names are lowercase, as host names are case-insensitive.
+    """
+    handles = []
+    for profile_name, pages_name in HANDLE_PATTERN.findall(text or ""):
+        handle = profile_name or pages_name.lower()
+        if handle.lower() not in RESERVED_NAMES:
+            handles.append(handle)
+    return list(dict.fromkeys(handles))
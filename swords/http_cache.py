@@ -0,0 +1,85 @@
+"""
+Persistent cache for GitHub API responses that is revalidated with conditional requests.
+"""
+import hashlib
+import json
+from pathlib import Path
+
+
+class ResponseCache:
+    """
+    Stores GitHub API responses on disk together with their ETag and Last-Modified headers.
+
+    directory (string): directory in which the responses are stored as JSON files
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def get_key(path, route=None, query=None, accept=None):
+        """Builds the cache key of a request
+
+        Args:
+            path (string): endpoint path, e.g. /repos/{owner}/{repo}/languages
+            route (dict): route parameters of the endpoint
+            query (dict): query parameters of the request
+            accept (string): media type of the request
+
+        Returns:
+            string: cache key
+        """
+        request = json.dumps([path, route or {}, query or {}, accept], sort_keys=True, default=str)
+        return hashlib.sha1(request.encode()).hexdigest()
+
+    def get(self, key):
+        """Returns the cached response for a key
+
+        Args:
+            key (string): cache key, see get_key
+
+        Returns:
+            dict: response with the keys body, headers, etag and last_modified.
+                  None if there is no cached response.
+        """
+        path = self.directory / f"{key}.json"
+        if not path.exists():
+            return None
+        try:
+            return json.loads(path.read_text(encoding="utf8"))
+        except ValueError:  # e.g. a partially written file of an interrupted run
+            return None
+
+    def put(self, key, body, headers):
+        """Stores a response if it can be revalidated
+
+        Args:
+            key (string): cache key, see get_key
+            body: JSON compatible response body
+            headers (dict): response headers
+        """
+        headers_lower = {name.lower(): value for name, value in headers.items()}
+        etag, last_modified = headers_lower.get("etag"), headers_lower.get("last-modified")
+        if etag is None and last_modified is None:
+            return
+        entry = {"etag": etag, "last_modified": last_modified, "headers": headers, "body": body}
+        path = self.directory / f"{key}.json"
+        path.write_text(json.dumps(entry), encoding="utf8")
+
+    @staticmethod
+    def get_validators(entry):
+        """Returns the request headers that make a request conditional on a cached response
+
+        Args:
+            entry (dict): cached response, see get
+
+        Returns:
+            dict: If-None-Match and If-Modified-Since headers
+        """
+        validators = {}
+        if entry.get("etag"):
+            validators["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            validators["If-Modified-Since"] = entry["last_modified"]
+        return validators
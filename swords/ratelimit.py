@@ -0,0 +1,99 @@
+"""
+Rate limiter that paces requests based on the rate limit headers of the responses.
+"""
+import threading
+import time
+
+
+class RateLimiter:  # pylint: disable=too-many-instance-attributes
+    """
+    Thread-safe token bucket that spreads the remaining request budget evenly
+    over the time until the budget resets.
+
+    The budget is read from the X-RateLimit-Remaining and X-RateLimit-Reset headers
+    of each response, see update. A Retry-After header (secondary rate limits) pauses
+    all requests for the given time. Before each request, acquire blocks until the
+    request may be sent. Up to `burst` requests can be sent at once, after that the
+    requests are paced. If no headers were received yet, requests are paced by
+    `min_interval` only.
+
+    min_interval (float): minimum average number of seconds between two requests
+    burst (int): number of requests that can be sent without pacing
+    reserve (int): number of requests that are kept in reserve. If the remaining
+        budget drops to the reserve, requests wait until the budget resets.
+    resource (string): rate limit resource that is tracked. Responses that report the
+        budget of another resource (X-RateLimit-Resource), such as graphql or search,
+        do not change the budget.
+    """
+
+    def __init__(self, min_interval=0.0, burst=50, reserve=5, resource="core"):
+        self.min_interval = min_interval
+        self.resource = resource
+        self.burst = burst
+        self.reserve = reserve
+        self.remaining = None
+        self.limit = None
+        self.reset = None  # epoch seconds of the next budget reset
+        self.paused_until = 0.0
+        self.next_request = 0.0  # theoretical arrival time of the next paced request
+        self.lock = threading.Lock()
+
+    def get_interval(self, now):
+        """Returns the number of seconds between two requests to spend the budget evenly
+
+        Args:
+            now (float): current time in epoch seconds
+        """
+        if self.remaining is None or self.reset is None:
+            return self.min_interval
+        spendable = max(self.remaining - self.reserve, 1)
+        return max(self.min_interval, (self.reset - now) / spendable)
+
+    def acquire(self):
+        """Blocks until the next request may be sent"""
+        with self.lock:
+            now = time.time()
+            start = max(now, self.paused_until)
+            if self.reset is not None and start >= self.reset:
+                # the budget has been reset, the next response tells the new budget
+                self.remaining, self.reset = None, None
+            elif self.remaining is not None and self.remaining <= self.reserve:
+                print(f"Reached request limit. Sleep for {int(self.reset - now) + 1} seconds.")
+                start = self.reset + 1
+                self.remaining, self.reset = None, None
+            interval = self.get_interval(start)
+            start = max(start, self.next_request - self.burst * interval)
+            self.next_request = max(self.next_request, start) + interval
+            if self.remaining is not None:
+                # count the request before its response arrives,
+                # so concurrent requests don't overspend the budget
+                self.remaining -= 1
+        time.sleep(max(0.0, start - time.time()))
+
+    def update(self, headers):
+        """Updates the budget from the headers of a response
+
+        Args:
+            headers (dict): response headers
+        """
+        headers = {name.lower(): value for name, value in (headers or {}).items()}
+        tracked = headers.get("x-ratelimit-resource", self.resource) == self.resource
+        with self.lock:
+            if (tracked and "x-ratelimit-remaining" in headers
+                    and "x-ratelimit-reset" in headers):
+                self.remaining = int(headers["x-ratelimit-remaining"])
+                self.reset = int(headers["x-ratelimit-reset"])
+            if tracked and "x-ratelimit-limit" in headers:
+                self.limit = int(headers["x-ratelimit-limit"])
+            if "retry-after" in headers:
+                self.paused_until = max(self.paused_until,
+                                        time.time() + int(headers["retry-after"]))
+
+    def pause(self, seconds):
+        """Postpones all following requests by the given number of seconds
+
+        Args:
+            seconds (float): time to wait before the next request is sent
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.time() + seconds)
@@ -0,0 +1,140 @@
+"""
+Retries of failed requests, based on the HTTP status code and headers of the response.
+"""
+import random
+import time
+
+# status codes of temporary failures that are retried with exponential backoff
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+# status codes of responses that can report an exceeded rate limit
+RATE_LIMIT_STATUS = {403, 429}
+
+
+def get_response_error(error):
+    """Returns the status code and headers of the HTTP response that caused an error.
+    Errors of urllib (used by GhApi) and requests (used by howfairis) are supported.
+    If the error was raised while handling another error, that error is inspected too.
+
+    Args:
+        error (Exception): the raised error
+
+    Returns:
+        tuple: status code and headers, None and an empty dict if there is no response
+    """
+    while error is not None:
+        response = getattr(error, "response", None)  # requests.HTTPError
+        status = getattr(response, "status_code", None)
+        if status is not None:
+            return status, dict(response.headers or {})
+        status = getattr(error, "code", None)  # urllib.error.HTTPError
+        if isinstance(status, int) and hasattr(error, "headers"):
+            return status, dict(error.headers or {})
+        error = error.__cause__ or error.__context__
+    return None, {}
+
+
+def get_status(error):
+    """Returns the status code of the HTTP response that caused an error,
+    None if the error was not caused by a response, see get_response_error"""
+    return get_response_error(error)[0]
+
+
+def is_network_error(error):
+    """Returns whether an error is a connection error or timeout without a response.
+    Network errors of urllib, socket and requests are all OSErrors."""
+    while error is not None:
+        if isinstance(error, OSError):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class RetryPolicy:
+    """
+    Calls a function and retries it if it fails temporarily.
+
+    - Responses of an exceeded rate limit (403 or 429 with a Retry-After header, or
+      with X-RateLimit-Remaining 0) are retried after the given time or the reset
+      of the rate limit.
+    - Server errors, 408 and 429 responses and network errors are retried with
+      exponential backoff: the n-th retry waits a random time between 0 and
+      base_delay * 2 ** (n - 1) seconds, at most max_delay seconds (full jitter).
+    - Other errors, such as 404 or a 403 without rate limit headers, are raised
+      immediately, as a retry would fail in the same way.
+
+    A call is tried at most `max_attempts` times, after that the last error is raised.
+
+    max_attempts (int): maximum number of attempts per call
+    base_delay (float): maximum number of seconds before the first backoff retry
+    max_delay (float): maximum number of seconds of a backoff
+    limiter (RateLimiter): Optional. Acquired before every attempt. Waits for a rate
+        limit reset pause the limiter, so all requests that share it wait.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=60.0, limiter=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = limiter
+
+    def get_rate_limit_wait(self, status, headers):
+        """Returns the number of seconds until an exceeded rate limit allows requests again,
+        None if the response does not report an exceeded rate limit
+
+        Args:
+            status (int): status code of the response
+            headers (dict): headers of the response
+        """
+        headers = {name.lower(): value for name, value in headers.items()}
+        if status not in RATE_LIMIT_STATUS:
+            return None
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+        if headers.get("x-ratelimit-remaining") == "0" and "x-ratelimit-reset" in headers:
+            return max(0.0, int(headers["x-ratelimit-reset"]) - time.time() + 1)
+        return None
+
+    def get_delay(self, error, attempt):
+        """Returns the number of seconds to wait before the next attempt,
+        None if the error should not be retried
+
+        Args:
+            error (Exception): the error of the failed attempt
+            attempt (int): number of the failed attempt, starting at 1
+        """
+        if attempt >= self.max_attempts:
+            return None
+        status, headers = get_response_error(error)
+        wait = self.get_rate_limit_wait(status, headers)
+        if wait is not None:
+            return wait
+        if status in TRANSIENT_STATUS or (status is None and is_network_error(error)):
+            return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        return None
+
+    def call(self, func, *args, **kwargs):
+        """Calls func with the given arguments and retries it according to the policy
+
+        Args:
+            func (callable): function that sends the request(s)
+
+        Returns:
+            the result of func
+        """
+        attempt = 1
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:  # pylint: disable=broad-except
+                delay = self.get_delay(e, attempt)
+                if delay is None:
+                    raise
+                print(f"Attempt {attempt} of {self.max_attempts} failed: {e}."
+                      f" Retry in {delay:.1f} seconds.")
+                if self.limiter is not None:
+                    self.limiter.pause(delay)
+                else:
+                    time.sleep(delay)
+                attempt += 1
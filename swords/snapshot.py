@@ -0,0 +1,39 @@
+"""
+Comparison of repository listings for incremental refreshes of the variables.
+"""
+import pandas as pd
+
+
+def get_unchanged_repos(df_repos, df_previous, key="html_url", column="pushed_at"):
+    """Returns the repositories that were not pushed to since the previous listing.
+    Repositories that are new in the current listing are not unchanged.
+
+    Args:
+        df_repos (DataFrame): current repository listing of collect_repositories
+        df_previous (DataFrame): repository listing that was used for the previous run
+        key (string): column that identifies a repository
+        column (string): column that changes when a repository changes
+
+    Returns:
+        set: keys of the unchanged repositories
+    """
+    previous = dict(zip(df_previous[key], df_previous[column].fillna("").astype(str)))
+    current = zip(df_repos[key], df_repos[column].fillna("").astype(str))
+    return {repo_key for repo_key, value in current
+            if repo_key in previous and previous[repo_key] == value}
+
+
+def select_rows(df_output, repo_keys, key="html_url_repository"):
+    """Selects the rows of a previous output that belong to the given repositories
+
+    Args:
+        df_output (DataFrame): previous output of a variable script
+        repo_keys (set): keys of the repositories
+        key (string): column of the output that identifies a repository
+
+    Returns:
+        DataFrame: rows of the repositories in the order of the previous output
+    """
+    if df_output is None or key not in df_output.columns:
+        return pd.DataFrame()
+    return df_output[df_output[key].isin(repo_keys)]
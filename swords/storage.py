@@ -0,0 +1,127 @@
+"""
+Reading and writing of the result tables of the pipeline. The file format of a table
+that is read is detected from its content, the format of a table that is written is
+selected by its file extension.
+"""
+from pathlib import Path
+
+import pandas as pd
+
+# file formats by file extension. Files with another extension are read and written as CSV
+FORMATS = {".csv": "csv", ".xlsx": "excel", ".parquet": "parquet", ".feather": "feather"}
+# file formats by the first bytes of a file
+MAGIC_BYTES = {b"PAR1": "parquet", b"ARROW1": "feather", b"PK\x03\x04": "excel"}
+
+
+def get_format(file_path):
+    """Returns the file format of a result table by its file extension
+
+    Args:
+        file_path (string): path to the file
+
+    Returns:
+        string: csv, excel, parquet or feather
+    """
+    return FORMATS.get(Path(file_path).suffix.lower(), "csv")
+
+
+def detect_format(file_path):
+    """Returns the file format of an existing result table. The format is detected
+    from the first bytes of the file, so files with a misleading or missing extension
+    are read correctly. Text files are CSV files.
+
+    Args:
+        file_path (string): path to the file
+
+    Returns:
+        string: csv, excel, parquet or feather
+    """
+    with open(file_path, "rb") as table_file:
+        start = table_file.read(8)
+    for magic_bytes, file_format in MAGIC_BYTES.items():
+        if start.startswith(magic_bytes):
+            return file_format
+    return "csv"
+
+
+def read_table(file_path, columns=None, dtype=None):
+    """Reads a result table. Parquet and Feather files keep the types of the columns,
+    only the requested columns are read from disk and the files are memory-mapped
+    instead of copied into memory first. These formats require pyarrow.
+
+    Args:
+        file_path (string): path to the file
+        columns (list): Optional. Columns that should be read. By default, all columns are read.
+        dtype (dict): Optional. Types of columns, e.g. {"id": "Int64"}
+
+    Returns:
+        DataFrame
+    """
+    file_format = detect_format(file_path)
+    if file_format == "parquet":
+        df_table = pd.read_parquet(file_path, columns=columns, memory_map=True)
+    elif file_format == "feather":
+        from pyarrow import feather  # pylint: disable=import-outside-toplevel
+        df_table = feather.read_table(file_path, columns=columns, memory_map=True).to_pandas()
+    elif file_format == "excel":
+        return pd.read_excel(file_path, engine='openpyxl', usecols=columns, dtype=dtype)
+    else:
+        return pd.read_csv(file_path, usecols=columns, dtype=dtype)
+    return df_table.astype(dtype) if dtype else df_table
+
+
+def iter_table(file_path, columns=None, dtype=None, chunksize=10000):
+    """Reads a result table in chunks of rows, so only one chunk is held in memory.
+    Excel files can not be read in chunks and are read at once.
+
+    Args:
+        file_path (string): path to the file
+        columns (list): Optional. Columns that should be read. By default, all columns are read.
+        dtype (dict): Optional. Types of columns, e.g. {"id": "Int64"}
+        chunksize (int): number of rows per chunk
+
+    Yields:
+        DataFrame: the next chunk of rows
+    """
+    file_format = detect_format(file_path)
+    if file_format == "csv":
+        yield from pd.read_csv(file_path, usecols=columns, dtype=dtype, chunksize=chunksize)
+        return
+    if file_format == "parquet":
+        from pyarrow import parquet  # pylint: disable=import-outside-toplevel
+        batches = parquet.ParquetFile(file_path, memory_map=True).iter_batches(
+            batch_size=chunksize, columns=columns)
+    elif file_format == "feather":
+        from pyarrow import feather  # pylint: disable=import-outside-toplevel
+        batches = feather.read_table(file_path, columns=columns,
+                                     memory_map=True).to_batches(max_chunksize=chunksize)
+    else:
+        df_table = read_table(file_path, columns, dtype)
+        batches = [df_table[start:start + chunksize]
+                   for start in range(0, len(df_table.index), chunksize)]
+    for batch in batches:
+        df_chunk = batch if isinstance(batch, pd.DataFrame) else batch.to_pandas()
+        yield df_chunk.astype(dtype) if dtype and file_format != "excel" else df_chunk
+
+
+def write_table(df_table, file_path, schema=None):
+    """Writes a result table without its index. The format is selected by the file extension.
+
+    Args:
+        df_table (DataFrame): table that should be written
+        file_path (string): path to the file
+        schema (dict): Optional. Types of columns that are applied before writing,
+                       e.g. {"id": "Int64"}
+    """
+    if schema:
+        df_table = df_table.astype({column: dtype for column, dtype in schema.items()
+                                    if column in df_table.columns})
+    file_format = get_format(file_path)
+    if file_format == "parquet":
+        df_table.to_parquet(file_path, index=False)
+    elif file_format == "feather":
+        df_table.reset_index(drop=True).to_feather(file_path)
+    elif file_format == "excel":
+        df_table.to_excel(file_path, index=False)
+    else:
+        df_table.to_csv(file_path, index=False)
@@ -0,0 +1,96 @@
+"""
+Streaming CSV export with checkpoints, so interrupted runs can be resumed.
+"""
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from swords.storage import get_format, write_table
+
+
+class StreamingExport:
+    """
+    Appends retrieved variables to the output file as soon as a repository is processed.
+    The processed repositories are recorded in a checkpoint file next to the output
+    (`<output>.checkpoint`), together with the date of the run. If the retrieval is
+    resumed, repositories that were processed on the same date are skipped and new
+    rows are appended to the existing output. Otherwise, a new output file is started.
+    The checkpoint file is removed when the export is finished.
+
+    Rows can only be appended to CSV files. For other formats, see swords.storage,
+    the rows are appended to `<output>.partial.csv`, which is converted to the
+    output format when the export is finished.
+
+    output (string): file path
+    columns (List): column names of the retrieved variables
+    resume (boolean): if True, continue the output of an interrupted run of today
+    """
+
+    def __init__(self, output, columns, resume=False):
+        self.target = Path(output)
+        self.output = self.target if get_format(output) == "csv" else Path(f"{output}.partial.csv")
+        self.checkpoint = Path(f"{output}.checkpoint")
+        self.columns = columns
+        self.current_date = datetime.today().strftime('%Y-%m-%d')
+        self.processed = set()
+        if resume and self.checkpoint.exists():
+            with open(self.checkpoint, encoding="utf-8") as checkpoint_file:
+                for line in checkpoint_file:
+                    date, _, repo_url = line.rstrip("\n").partition("\t")
+                    if date == self.current_date:
+                        self.processed.add(repo_url)
+        if not self.processed:  # nothing to resume, start a new output
+            self.output.unlink(missing_ok=True)
+            self.checkpoint.unlink(missing_ok=True)
+
+    def is_processed(self, repo_url):
+        """Returns whether the repository was processed before the run was resumed"""
+        return repo_url in self.processed
+
+    def carry_forward(self, df_previous, repo_urls):
+        """Copies the rows of repositories from a previous output and records the
+        repositories as processed, so they are not retrieved again.
+
+        Args:
+            df_previous (DataFrame): rows of a previous output, including the date column
+            repo_urls (set): urls of the repositories that are carried forward
+        """
+        if not df_previous.empty:
+            df_previous.to_csv(self.output, mode="a", header=not self.output.exists(),
+                               index=False)
+        with open(self.checkpoint, "a", encoding="utf-8") as checkpoint_file:
+            for repo_url in repo_urls:
+                checkpoint_file.write(f"{self.current_date}\t{repo_url}\n")
+        self.processed.update(repo_urls)
+
+    def write(self, repo_url, variables_retrieved):
+        """Appends the retrieved variables of one repository to the output file
+        and records the repository in the checkpoint file.
+
+        Args:
+            repo_url (string): url of the processed repository
+            variables_retrieved (List): retrieved variables of the repository
+        """
+        if variables_retrieved or not self.output.exists():
+            df_data = pd.DataFrame(variables_retrieved, columns=self.columns)
+            df_data["date"] = self.current_date
+            df_data.to_csv(self.output, mode="a", header=not self.output.exists(), index=False)
+        with open(self.checkpoint, "a", encoding="utf-8") as checkpoint_file:
+            checkpoint_file.write(f"{self.current_date}\t{repo_url}\n")
+
+    def close(self, var_type):
+        """Finishes the export and removes the checkpoint file
+
+        Args:
+            var_type (string): Used to output which variables were retrieved
+        """
+        if not self.output.exists():  # no repository was processed
+            pd.DataFrame([], columns=self.columns + ["date"]).to_csv(self.output, index=False)
+        if self.output != self.target:
+            write_table(pd.read_csv(self.output), self.target)
+            self.output.unlink()
+        self.checkpoint.unlink(missing_ok=True)
+        print(
+            f"Successfully retrieved {var_type} variables. Saved result to {self.target}."
+        )
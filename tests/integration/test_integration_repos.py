@@ -6,7 +6,7 @@ import pytest
 from ghapi.all import GhApi
 import time
 
-from collect_repositories.scripts.repositories import get_repos, get_repos_formatted, Service
+from collect_repositories.scripts.repositories import get_repos, get_repos_dataframe, Service
 
 """
 Tests for repositories.py
@@ -24,7 +24,7 @@ def test_get_repos_from_users(service):
     for user in df_users:
         repos = get_repos(user, service)
         if repos is not None:
-            repos_formatted = get_repos_formatted(repos)
-            result_repos.extend(repos_formatted)
+            result_repos.extend(repos)
         time.sleep(5)
-    assert len(result_repos) >= 5
+    df_repos = get_repos_dataframe(result_repos)
+    assert len(df_repos.index) >= 5
@@ -10,8 +10,9 @@ import time
 
 from collect_users.methods.github_search.github_search import get_complete_query_result, get_users_from_repos, get_users_from_users
 from collect_users.methods.profile_pages.uu_api_crawler import get_all_employee_github_usernames, get_employees_url
-from collect_users.scripts.enrich_users import read_input_file, get_userdata, update_users, Service
+from collect_users.scripts.enrich_users import get_userdata, update_users, Service
 from collect_users.scripts.prepare_filtering import is_student
+from swords.storage import read_table
 
 """
 Tests for github_search.py
@@ -69,17 +70,17 @@ def path():
 
 @pytest.fixture
 def users_merged(path):
-    return read_input_file(os.path.join(path, "test_data/users_merged.csv"))
+    return read_table(os.path.join(path, "test_data/users_merged.csv"))
 
 
 @pytest.fixture
 def users_enriched(path):
-    return read_input_file(os.path.join(path, "test_data/users_enriched.xlsx"))
+    return read_table(os.path.join(path, "test_data/users_enriched.xlsx"))
 
 
 @pytest.fixture
 def users_enriched_old(path):
-    return read_input_file(os.path.join(path, "test_data/users_enriched_summer2021.xlsx"))
+    return read_table(os.path.join(path, "test_data/users_enriched_summer2021.xlsx"))
 
 
 def test_enrich_new_users(users_merged, service):
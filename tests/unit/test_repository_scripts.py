@@ -6,7 +6,9 @@ from unittest.mock import MagicMock, Mock
 
 from fastcore.foundation import AttrDict, L
 
-from collect_repositories.scripts.repositories import get_repos, get_repos_formatted
+from collect_repositories.scripts.repositories import (get_repos,
+                                                       get_repos_dataframe,
+                                                       get_users_repos)
 
 
 @pytest.fixture
@@ -43,6 +45,43 @@ def test_get_repos():
     result = get_repos("kequach", service) 
     assert result[0]["name"] == "MyAnimeList-Analysis"
 
-def test_get_repos_formatted(mock_repos):
-    result = get_repos_formatted(mock_repos) 
-    assert result[0]["name"] == "MyAnimeList-Analysis"
\ No newline at end of file
+def test_get_repos_reuses_first_page():
+    def mock_get(user_id, per_page=30, page=1):
+        return L([AttrDict(name=f"{user_id}-repo-{page}", owner=AttrDict(login=user_id))])
+    service = MagicMock()
+    service.api.repos.list_for_user.side_effect = mock_get
+    service.api.last_page = Mock(return_value=3)
+
+    result = get_repos("kequach", service)
+    assert [repo["name"] for repo in result] == ["kequach-repo-1", "kequach-repo-2",
+                                                 "kequach-repo-3"]
+    assert service.api.repos.list_for_user.call_count == 3
+
+
+def test_get_users_repos():
+    def mock_get(user_id, per_page=30, page=1):
+        return L([AttrDict(name=f"{user_id}-repo", owner=AttrDict(login=user_id))])
+    service = MagicMock()
+    service.api.repos.list_for_user.side_effect = mock_get
+    service.api.last_page = Mock(return_value=0)
+
+    users = [f"user{i}" for i in range(8)]
+    result = get_users_repos(users, service, workers=4)
+    assert [repo["name"] for repo in result] == [f"{user}-repo" for user in users]
+
+
+def test_get_repos_dataframe_names(mock_repos):
+    result = get_repos_dataframe(mock_repos)
+    assert result["name"][0] == "MyAnimeList-Analysis"
+
+
+def test_get_repos_dataframe(mock_repos):
+    mock_repos[0]["license"] = AttrDict(key="mit", name="MIT License")
+    mock_repos[0]["permissions"] = AttrDict(admin=False)
+    mock_repos[1]["license"] = None
+
+    result = get_repos_dataframe(mock_repos)
+    assert list(result["owner"]) == ["kequach", "kequach"]
+    assert result["license"][0] == "MIT License" and result["license"].isna()[1]
+    assert result["permissions"][0] == ""
+    assert str(result["id"].dtype) == "Int64"
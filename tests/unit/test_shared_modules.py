@@ -0,0 +1,295 @@
+"""
+Tests for the shared modules in swords
+"""
+import pytest
+from urllib.error import HTTPError
+
+import pandas as pd
+
+from swords.contributors import join_contributors, split_contributors
+from swords.github_client import GitHubClient
+from swords.graphql import get_readme_path
+from swords.handles import find_github_handles
+from swords.ratelimit import RateLimiter
+from swords.retry import RetryPolicy, get_status
+from swords.snapshot import get_unchanged_repos, select_rows
+from swords.storage import detect_format, iter_table, read_table, write_table
+from swords.streaming import StreamingExport
+
+
+"""
+Tests for github_client.py
+"""
+
+@pytest.fixture
+def client(tmp_path):
+    return GitHubClient(token="test_token", cache_dir=tmp_path)
+
+
+def test_github_client_conditional_request(client, monkeypatch):
+    sent_headers = []
+    def mock_send(url, verb, headers=None, **kwargs):
+        sent_headers.append(headers)
+        if len(sent_headers) == 1:
+            return {"Python": 1337}, {"etag": '"abc"', "X-RateLimit-Remaining": "4999",
+                                      "X-RateLimit-Limit": "5000"}
+        raise HTTPError(url, 304, "Not Modified", {"ETag": '"abc"'}, None)
+    monkeypatch.setattr("ghapi.core.urlsend", mock_send)
+
+    first = client.repos.list_languages("kequach", "HTML-Examples")
+    second = client.repos.list_languages("kequach", "HTML-Examples")
+    assert "If-None-Match" not in sent_headers[0]
+    assert sent_headers[1]["If-None-Match"] == '"abc"'
+    assert first == second and second["Python"] == 1337
+
+
+def test_github_client_not_cached_error(client, monkeypatch):
+    def mock_send(url, verb, headers=None, **kwargs):
+        raise HTTPError(url, 404, "Not Found", {}, None)
+    monkeypatch.setattr("ghapi.core.urlsend", mock_send)
+
+    with pytest.raises(HTTPError):
+        client.repos.list_languages("kequach", "does-not-exist")
+
+
+"""
+Tests for ratelimit.py
+"""
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("swords.ratelimit.time.time", lambda: now[0])
+    monkeypatch.setattr("swords.ratelimit.time.sleep",
+                        lambda seconds: now.__setitem__(0, now[0] + seconds))
+    return now
+
+
+def test_rate_limiter_paces_budget(clock):
+    limiter = RateLimiter(burst=0, reserve=0)
+    limiter.update({"X-RateLimit-Remaining": "10", "X-RateLimit-Reset": "1100"})
+    limiter.acquire()
+    limiter.acquire()
+    # 100 seconds until reset for 10 requests: one request every 10 seconds
+    assert clock[0] == pytest.approx(1010)
+    assert limiter.remaining == 8
+
+
+def test_rate_limiter_waits_for_reset(clock):
+    limiter = RateLimiter(reserve=5)
+    limiter.update({"x-ratelimit-remaining": "5", "x-ratelimit-reset": "1300"})
+    limiter.acquire()
+    assert clock[0] == pytest.approx(1301)
+    assert limiter.remaining is None
+
+
+def test_rate_limiter_ignores_other_resources(clock):
+    limiter = RateLimiter()
+    limiter.update({"X-RateLimit-Remaining": "4000", "X-RateLimit-Reset": "2000",
+                    "X-RateLimit-Resource": "core"})
+    limiter.update({"X-RateLimit-Remaining": "10", "X-RateLimit-Reset": "1500",
+                    "X-RateLimit-Resource": "graphql"})
+    assert limiter.remaining == 4000 and limiter.reset == 2000
+
+
+def test_rate_limiter_retry_after(clock):
+    limiter = RateLimiter()
+    limiter.update({"Retry-After": "60"})
+    limiter.acquire()
+    assert clock[0] == pytest.approx(1060)
+
+
+"""
+Tests for retry.py
+"""
+
+def failing(*errors):
+    """Returns a function that raises the given errors one by one and then succeeds"""
+    calls = []
+    def func():
+        calls.append(len(calls))
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "ok"
+    func.calls = calls
+    return func
+
+
+def http_error(status, headers=None):
+    return HTTPError("https://api.github.com", status, "error", headers or {}, None)
+
+
+def test_retry_policy_fails_fast(clock):
+    func = failing(http_error(404))
+    with pytest.raises(HTTPError):
+        RetryPolicy().call(func)
+    assert len(func.calls) == 1 and clock[0] == 1000
+
+
+def test_retry_policy_backoff(clock):
+    func = failing(http_error(502), ConnectionResetError(), http_error(503))
+    assert RetryPolicy(base_delay=1).call(func) == "ok"
+    assert len(func.calls) == 4
+    # full jitter: at most 1 + 2 + 4 seconds
+    assert 1000 <= clock[0] <= 1007
+
+
+def test_retry_policy_rate_limit(clock):
+    func = failing(http_error(403, {"Retry-After": "30"}),
+                   http_error(403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1100"}))
+    limiter = RateLimiter()
+    assert RetryPolicy(limiter=limiter).call(func) == "ok"
+    assert clock[0] == pytest.approx(1101)
+    # a 403 without rate limit headers is not retried
+    with pytest.raises(HTTPError):
+        RetryPolicy().call(failing(http_error(403)))
+
+
+def test_retry_policy_max_attempts(clock):
+    func = failing(*[http_error(500)] * 5)
+    with pytest.raises(HTTPError):
+        RetryPolicy(max_attempts=3).call(func)
+    assert len(func.calls) == 3
+
+
+def test_get_status():
+    try:
+        try:
+            raise http_error(404)
+        except HTTPError as e:
+            raise ValueError("Something went wrong") from e
+    except ValueError as e:
+        assert get_status(e) == 404
+    assert get_status(ValueError()) is None
+
+
+"""
+Tests for graphql.py
+"""
+
+def test_get_readme_path():
+    node = {"readmeGithub": {"entries": [{"name": "ISSUE_TEMPLATE", "type": "tree"}]},
+            "readmeRoot": {"entries": [{"name": "README.rst", "type": "blob"},
+                                       {"name": "readme.md", "type": "blob"}]},
+            "readmeDocs": {"entries": [{"name": "README.md", "type": "blob"}]}}
+    assert get_readme_path(node) == "readme.md"
+    node["readmeRoot"] = None
+    assert get_readme_path(node) == "docs/README.md"
+
+
+"""
+Tests for handles.py
+"""
+
+@pytest.mark.parametrize("text,handles", [
+    ("Code can be found on GitHub: https://github.com/gbeckers/BirdwatcherIt is open",
+     ["gbeckers"]),
+    ('<a href="https://github.com/kequach">GitHub</a> and github.com/kequach.', ["kequach"]),
+    ("http://gerkovink.github.io/miceVignettes/index.html", ["gerkovink"]),
+    ("https://github.com/orgs/UtrechtUniversity/teams and www.github.com/J535D165",
+     ["UtrechtUniversity", "J535D165"]),
+    ("docs.github.com/en, github.com/features and notgithub.com/someone", []),
+    ("github.com/name_with_underscore and github.com", []),
+])
+def test_find_github_handles(text, handles):
+    assert find_github_handles(text) == handles
+
+
+"""
+Tests for snapshot.py
+"""
+
+def test_get_unchanged_repos():
+    df_previous = pd.DataFrame({"html_url": ["a", "b", "c"],
+                                "pushed_at": ["2022-01-01", "2022-01-01", None]})
+    df_repos = pd.DataFrame({"html_url": ["a", "b", "c", "d"],
+                             "pushed_at": ["2022-01-01", "2022-03-01", None, "2022-03-01"]})
+    unchanged = get_unchanged_repos(df_repos, df_previous)
+    assert unchanged == {"a", "c"}
+
+    df_output = pd.DataFrame({"html_url_repository": ["a", "a", "b", "d"],
+                              "language": ["Python", "R", "Python", "C"]})
+    assert list(select_rows(df_output, unchanged)["language"]) == ["Python", "R"]
+
+
+"""
+Tests for storage.py
+"""
+
+@pytest.mark.parametrize("file_name", ["table.csv", "table.parquet", "table.feather",
+                                       "table.xlsx"])
+def test_write_read_table(tmp_path, file_name):
+    df_table = pd.DataFrame({"html_url": ["a", "b"], "stargazers_count": [1, None],
+                             "fork": [True, False]})
+    write_table(df_table, str(tmp_path / file_name), schema={"stargazers_count": "Int64"})
+
+    result = read_table(str(tmp_path / file_name), columns=["html_url", "stargazers_count"],
+                        dtype={"stargazers_count": "Int64"})
+    assert list(result.columns) == ["html_url", "stargazers_count"]
+    assert result["stargazers_count"][0] == 1 and result["stargazers_count"].isna()[1]
+
+
+def test_detect_format(tmp_path):
+    write_table(pd.DataFrame({"html_url": ["a"]}), str(tmp_path / "table.parquet"))
+    (tmp_path / "table.parquet").rename(tmp_path / "table.csv")
+
+    assert detect_format(str(tmp_path / "table.csv")) == "parquet"
+    assert list(read_table(str(tmp_path / "table.csv"))["html_url"]) == ["a"]
+
+
+@pytest.mark.parametrize("file_name", ["table.csv", "table.parquet", "table.feather"])
+def test_iter_table(tmp_path, file_name):
+    df_table = pd.DataFrame({"html_url": [f"repo{i}" for i in range(5)], "readme": "text"})
+    write_table(df_table, str(tmp_path / file_name))
+
+    chunks = list(iter_table(str(tmp_path / file_name), columns=["html_url"], chunksize=2))
+    assert [len(chunk.index) for chunk in chunks] == [2, 2, 1]
+    assert list(pd.concat(chunks)["html_url"]) == list(df_table["html_url"])
+    assert list(chunks[0].columns) == ["html_url"]
+
+
+"""
+Tests for streaming.py
+"""
+
+def test_streaming_export_parquet(tmp_path):
+    output = str(tmp_path / "languages.parquet")
+    export = StreamingExport(output, ["html_url_repository", "language", "num_chars"])
+    export.write("https://github.com/kequach/HTML-Examples",
+                 [["https://github.com/kequach/HTML-Examples", "HTML", 1337]])
+    export.close("language")
+
+    result = read_table(output)
+    assert list(result["language"]) == ["HTML"]
+    assert not (tmp_path / "languages.parquet.partial.csv").exists()
+
+
+"""
+Tests for contributors.py
+"""
+
+def test_split_join_contributors():
+    df_contributors = pd.DataFrame({
+        "html_url_repository": ["https://github.com/kequach/HTML-Examples",
+                                "https://github.com/kequach/MyAnimeList-Analysis",
+                                "https://github.com/kequach/MyAnimeList-Analysis"],
+        "login": ["kequach", "kequach", "J535D165"],
+        "id": [18238845, 18238845, 5402633],
+        "node_id": ["MDQ6VXNlcjE4MjM4ODQ1", "MDQ6VXNlcjE4MjM4ODQ1", "MDQ6VXNlcjU0MDI2MzM="],
+        "followers_url": ["https://api.github.com/users/kequach/followers",
+                          "https://api.github.com/users/kequach/followers",
+                          "https://api.github.com/users/J535D165/followers"],
+        "type": "User",
+        "site_admin": False,
+        "contributions": [150, 12, 200],
+        "date": "2022-08-13"})
+
+    df_contributions, df_users = split_contributors(df_contributors)
+    assert list(df_contributions.columns) == ["html_url_repository", "login", "id",
+                                              "contributions", "date"]
+    assert list(df_users["login"]) == ["kequach", "J535D165"]
+    assert "followers_url" not in df_users.columns
+
+    result = join_contributors(df_contributions, df_users)
+    assert list(result["node_id"]) == list(df_contributors["node_id"])
+    assert list(result["contributions"]) == [150, 12, 200]
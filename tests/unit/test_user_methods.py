@@ -4,11 +4,14 @@ Tests for retrieval methods in user collection
 import pytest
 from unittest.mock import MagicMock, Mock
 
+import requests
+
 from fastcore.foundation import L, AttrDict
 from ghapi.all import GhApi
 
 from collect_users.methods.github_search.github_search import get_complete_query_result, get_users_from_repos, get_users_from_users, Service
-from collect_users.methods.pure.pure import get_username_from_text
+from collect_users.methods.pure.pure import get_username_from_text, iter_entries
+from collect_users.methods.profile_pages import uu_api_crawler
 
 
 """
@@ -67,6 +70,56 @@ def test_get_complete_query_result_repos():
     assert result[0]["login"] == "kequach"
 
 
+"""
+Tests for uu_api_crawler.py
+"""
+
+def test_get_faculty_employees(monkeypatch):
+    faculties = {1: {"Employees": [{"Url": "a.kequach"}, {"Url": "b.beckers"}]},
+                 2: {"Employees": []},
+                 3: {"Employees": [{"Url": "b.beckers"}, {"Url": "c.debruin"}]}}
+    requested_urls = []
+    def mock_get_json(request_url):
+        requested_urls.append(request_url)
+        faculty_number = int(request_url.split("f=")[1].split("&")[0])
+        return faculties.get(faculty_number)
+    monkeypatch.setattr(uu_api_crawler, "get_json", mock_get_json)
+
+    result = uu_api_crawler.get_faculty_employees(max_missing=3)
+    assert result == ["a.kequach", "b.beckers", "c.debruin"]
+    # probing stops after three consecutive numbers without a faculty
+    assert len(requested_urls) == 7
+
+
+def test_get_faculty_employees_errors(monkeypatch):
+    def http_error(status):
+        response = requests.Response()
+        response.status_code = status
+        return requests.HTTPError(f"{status} error", response=response)
+    errors = {1: [requests.ConnectionError("reset"), http_error(503)], 2: [http_error(500)] * 4}
+    def mock_get_json(request_url):
+        faculty_number = int(request_url.split("f=")[1].split("&")[0])
+        if errors.get(faculty_number):
+            raise errors[faculty_number].pop(0)
+        return {"Employees": [{"Url": f"employee{faculty_number}"}]} if faculty_number < 2 else None
+    monkeypatch.setattr(uu_api_crawler, "get_json", mock_get_json)
+    monkeypatch.setattr("swords.retry.time.sleep", lambda seconds: None)
+
+    # transient errors are retried and do not count as missing faculties
+    assert uu_api_crawler.get_faculty_employees(max_faculty=2, max_missing=1) == [
+        "employee0", "employee1"]
+    # errors that persist are raised instead of ending the probe
+    with pytest.raises(requests.HTTPError):
+        uu_api_crawler.get_faculty_employees(max_faculty=3, max_missing=1)
+
+
+def test_parse_urls_for_github_name():
+    links = [{"Name": "Github", "Url": "https://github.com/kequach"},
+             {"Name": "Website", "Url": None},
+             {"Name": "Blog", "Url": "https://asreview.github.io/"}]
+    assert uu_api_crawler.parse_urls_for_github_name(links) == ["kequach", "asreview"]
+
+
 """
 Tests for pure.py
 """
@@ -103,4 +156,20 @@ def test_get_username_from_text_empty(rispy_no_github):
 
 def test_get_username_from_text_found(rispy_github):
     user = get_username_from_text(rispy_github.values()) 
-    assert user == "gbeckers"
\ No newline at end of file
+    assert user == "gbeckers"
+
+def test_get_username_from_text_urls():
+    rispy = {"type_of_reference": "ADVS",
+             "primary_title": "brokenstick",
+             "urls": ["https://github.com/growthcharts/brokenstick"],
+             "publisher": "Github"}
+    user = get_username_from_text(rispy.values())
+    assert user == "growthcharts"
+
+
+def test_iter_entries():
+    lines = ["TY  - ADVS\n", "T1  - Birdwatcher\n", "UR  - https://github.com/gbeckers/Birdwatcher\n",
+             "ER  - \n", "\n", "TY  - ADVS\n", "T1  - ASReview\n", "ER  - \n"]
+    entries = iter_entries(iter(lines))
+    assert next(entries)["primary_title"] == "Birdwatcher"
+    assert [entry["primary_title"] for entry in entries] == ["ASReview"]
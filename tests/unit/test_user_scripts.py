@@ -5,10 +5,13 @@ import pytest
 from unittest.mock import MagicMock
 import os
 
+import pandas as pd
+
 from fastcore.foundation import AttrDict
 
-from collect_users.scripts.enrich_users import read_input_file, get_userdata, update_users 
+from collect_users.scripts.enrich_users import get_userdata, get_userdata_graphql, update_users
 from collect_users.scripts.prepare_filtering import is_student 
+from swords.storage import read_table
 
 
 
@@ -19,15 +22,15 @@ def path():
 
 @pytest.fixture
 def users_merged(path):
-    return read_input_file(os.path.join(path, "test_data/users_merged.csv"))
+    return read_table(os.path.join(path, "test_data/users_merged.csv"))
 
 @pytest.fixture
 def users_enriched(path):
-    return read_input_file(os.path.join(path, "test_data/users_enriched.xlsx"))
+    return read_table(os.path.join(path, "test_data/users_enriched.xlsx"))
 
 @pytest.fixture
 def users_enriched_old(path):
-    return read_input_file(os.path.join(path, "test_data/users_enriched_summer2021.xlsx"))
+    return read_table(os.path.join(path, "test_data/users_enriched_summer2021.xlsx"))
 
 
 """
@@ -46,6 +49,27 @@ def test_get_userdata(users_merged):
     assert result["login"].values[0] == "kequach"
 
 
+def test_get_userdata_graphql(users_enriched):
+    user = {"__typename": "User", "login": "kequach", "id": "MDQ6VXNlcjE4MjM4ODQ1",
+            "avatarUrl": "https://avatars.githubusercontent.com/u/18238845?v=4",
+            "url": "https://github.com/kequach", "databaseId": 18238845, "name": "Keven Quach",
+            "company": None, "websiteUrl": None, "location": "Utrecht", "email": "",
+            "isHireable": False, "bio": None, "twitterUsername": None, "isSiteAdmin": False,
+            "createdAt": "2016-04-02T17:17:18Z", "updatedAt": "2021-11-02T10:41:17Z",
+            "repositories": {"totalCount": 21}, "gists": {"totalCount": 0},
+            "followers": {"totalCount": 3}, "following": {"totalCount": 4}}
+    service = MagicMock()
+    service.api.return_value = {"data": {"u0": user, "u1": None}}
+
+    result = get_userdata_graphql(["kequach", "nonexistent-user"], service)
+    assert service.api.call_count == 1
+    assert list(result["login"]) == ["kequach"]
+    # same columns as the REST API, login is renamed to user_id in the enriched users
+    assert list(result.columns[1:]) == list(users_enriched.loc[:, "id":"updated_at"].columns)
+    assert result["followers_url"][0] == "https://api.github.com/users/kequach/followers"
+    assert result["public_repos"][0] == 21 and result["email"][0] is None
+
+
 def test_update_users(users_enriched, users_enriched_old):
     users_enriched.rename({"user_id": "login"}, axis=1, inplace=True)
     result = update_users(users_enriched_old, users_enriched) 
@@ -54,6 +78,24 @@ def test_update_users(users_enriched, users_enriched_old):
     assert asreview_new["public_repos"].values[0] > asreview_old["public_repos"].values[0]
 
 
+def test_update_users_upsert():
+    df_users = pd.DataFrame({"user_id": ["kequach", "asreview"], "bio": ["PhD", "ASReview"],
+                             "public_repos": [21, 30]}, index=[4, 7])
+    df_new_users = pd.DataFrame({"login": ["asreview", "j535d165", "asreview"],
+                                 "bio": ["Old", "Research software", None],
+                                 "public_repos": [31, 5, 32],
+                                 "followers": [10, 2, 11]})
+
+    result = update_users(df_users, df_new_users)
+    assert list(result.index) == [4, 7, 8]
+    assert list(result.columns) == ["user_id", "bio", "public_repos", "followers"]
+    assert list(result["user_id"]) == ["kequach", "asreview", "j535d165"]
+    # the last occurrence is used and missing values overwrite existing values
+    assert pd.isna(result.loc[7, "bio"]) and result.loc[7, "public_repos"] == 32
+    assert pd.isna(result.loc[4, "followers"])
+    assert list(df_users.columns) == ["user_id", "bio", "public_repos"]
+
+
 """
 Tests for prepare_filtering.py
 """
@@ -1,9 +1,15 @@
 """
 Tests for methods in variable collection
 """
+import json
+import time
 import pytest
 from unittest.mock import MagicMock
 
+import pandas as pd
+import requests
+import simplejson
+
 from fastcore.foundation import AttrDict, L
 from howfairis import Compliance
 
@@ -13,10 +19,26 @@ from collect_variables.scripts.github_api.github import (get_data_from_api,
                                                          get_readmes,
                                                          get_file_locations,
                                                          get_test_location,
-                                                         Repo)
-
+                                                         get_commit_variables,
+                                                         get_tree,
+                                                         retrieve_variables,
+                                                         retrieve_repo_variables,
+                                                         retrieve_graphql_variables,
+                                                         Repo,
+                                                         Service,
+                                                         StreamingExport,
+                                                         TreeCache)
+from swords.github_client import GitHubClient
+from swords.ratelimit import RateLimiter
+from swords.retry import RetryPolicy
+
+from collect_variables.scripts.all_variables import (assemble_repo_data, get_repo_data,
+                                                     get_repo_lines, group_records,
+                                                     write_repo_lines)
 from collect_variables.scripts.howfairis_api.howfairis_variables import (get_howfairis_compliance,
-                                                                         parse_repo)
+                                                                         get_offline_variables,
+                                                                         has_citation_files,
+                                                                         parse_repo, parse_repos)
 
 
 @pytest.fixture
@@ -39,6 +61,66 @@ def test_parse_repo(mock_repo, monkeypatch):
     assert "asreview-covid19" in result[0] and True == result[1] 
 
 
+def test_parse_repos(monkeypatch):
+    def mock_get(url_repo):
+        time.sleep(0.05 if url_repo.endswith("0") else 0)  # the first check finishes last
+        return (True, url_repo.endswith("1"), False, False, False)
+    module = "collect_variables.scripts.howfairis_api.howfairis_variables"
+    monkeypatch.setattr(f"{module}.get_howfairis_compliance", mock_get)
+    monkeypatch.setattr(f"{module}.retry_policy", RetryPolicy(limiter=RateLimiter()))
+
+    urls = [f"https://github.com/kequach/repo{i}" for i in range(4)]
+    result = parse_repos(urls, workers=4)
+    assert [entry[0] for entry in result] == urls
+    assert [entry[2] for entry in result] == [False, True, False, False]
+
+
+def test_get_offline_variables():
+    df_repos = pd.DataFrame({"html_url": ["https://github.com/asreview/asreview",
+                                          "https://github.com/kequach/HTML-Examples"],
+                             "license": ["Apache License 2.0", None]})
+    df_readmes = pd.DataFrame({
+        "html_url_repository": ["https://github.com/asreview/asreview",
+                                "https://github.com/kequach/HTML-Examples"],
+        "readme": ["[![PyPI](https://badge.fury.io/py/asreview.svg)](https://pypi.org)\n"
+                   "[![DOI](https://zenodo.org/badge/DOI/10.5281/zenodo.3345592.svg)]",
+                   "<!-- [![PyPI](https://img.shields.io/pypi/v/html)] -->"]})
+    df_files = pd.DataFrame({"html_url_repository": ["https://github.com/kequach/HTML-Examples"],
+                             "file_location": ["CITATION.cff"]})
+
+    result = get_offline_variables(df_repos, df_readmes, df_files)
+    assert result[0] == ["https://github.com/asreview/asreview", True, True, True, True, False]
+    # badges in comments are ignored
+    assert result[1] == ["https://github.com/kequach/HTML-Examples", True, False, False, True,
+                         False]
+
+
+def test_get_offline_variables_matches_checker(monkeypatch):
+    url = "https://github.com/kequach/HTML-Examples"
+    def mock_get(request_url, *args, **kwargs):
+        # a repository with a readme and a CITATION.cff file in the root
+        response = requests.Response()
+        response.status_code, response._content = 404, b""
+        if request_url == "https://api.github.com/repos/kequach/HTML-Examples":
+            response.status_code, response._content = 200, b'{"default_branch": "main"}'
+        elif request_url.endswith(("/README.md", "/CITATION.cff")):
+            response.status_code, response._content = 200, b"# HTML-Examples"
+        return response
+    monkeypatch.setattr("requests.get", mock_get)
+
+    df_files = pd.DataFrame({"html_url_repository": [url, url],
+                             "file_location": ["CITATION.cff", "docs/CITATION"]})
+    online = get_howfairis_compliance(url)
+    offline = get_offline_variables(
+        pd.DataFrame({"html_url": [url], "license": [None]}),
+        pd.DataFrame({"html_url_repository": [url], "readme": ["# HTML-Examples"]}),
+        df_files)
+    assert list(online) == offline[0][1:]
+    assert online[3] is True
+    assert has_citation_files(df_files)
+    assert not has_citation_files(df_files.iloc[1:])
+
+
 def test_get_howfairis_compliance(mock_repo, monkeypatch):
     def mock_get(*args, **kwargs):
         return Compliance(repository=True,
@@ -79,6 +161,7 @@ def test_get_data_from_api(mock_repo):
 
     service = MagicMock()
     service.api.git.get_tree.side_effect = mock_get
+    service.tree_cache = TreeCache()
     service.api.rate_limit.get.side_effect = mock_limit
     service.file_list = ["code_of_conduct"]
 
@@ -86,6 +169,20 @@ def test_get_data_from_api(mock_repo):
     assert result[0][1] == "code_of_conduct.md"
 
 
+def test_get_data_from_api_tracks_rate_limit(mock_repo, monkeypatch):
+    requested_urls = []
+    def mock_send(url, verb, headers=None, **kwargs):
+        requested_urls.append(url)
+        return {"Python": 1337}, {"X-RateLimit-Remaining": "4321", "X-RateLimit-Reset": "9999999999"}
+    monkeypatch.setattr("ghapi.core.urlsend", mock_send)
+
+    service = Service(api=GitHubClient(token="test_token", limiter=RateLimiter()))
+    get_data_from_api(service, mock_repo, "languages")
+    assert len(requested_urls) == 1 and "rate_limit" not in requested_urls[0]
+    assert service.remaining_requests == 4321
+    assert service.rate_limit_reset == 9999999999
+
+
 def test_get_contributors(mock_repo):
     def mock_get(*args, **kwargs):
         return L(AttrDict(login="kequach", contributions=150),
@@ -109,6 +206,7 @@ def test_get_files(mock_repo):
 
     service = MagicMock()
     service.api.git.get_tree.side_effect = mock_get
+    service.tree_cache = TreeCache()
 
     result = get_file_locations(service, mock_repo, [".ipynb"])
     assert result[0][1] == "analysis_notebook.ipynb"
@@ -124,10 +222,34 @@ def test_get_test_location(mock_repo):
 
     service = MagicMock()
     service.api.git.get_tree.side_effect = mock_get
+    service.tree_cache = TreeCache()
 
     result = get_test_location(service, mock_repo)
     assert result[0][1] == "tests"
 
+@pytest.mark.parametrize("full_commit_history", [False, True])
+def test_get_commit_variables(mock_repo, full_commit_history):
+    commits = L([AttrDict(commit=AttrDict(author=AttrDict(date="2022-03-01T10:00:00Z")),
+                          author=AttrDict(login="J535D165")),
+                 AttrDict(commit=AttrDict(author=AttrDict(date="2022-02-01T10:00:00Z")),
+                          author=AttrDict(login="chrisslewe")),
+                 AttrDict(commit=AttrDict(author=AttrDict(date="2022-01-01T10:00:00Z")),
+                          author=AttrDict(login="kequach"))])
+    def mock_list_commits(owner, repo, per_page, page=1):
+        return commits[(page - 1) * per_page:page * per_page]
+
+    service = MagicMock()
+    service.full_commit_history = full_commit_history
+    service.api.repos.list_commits.side_effect = mock_list_commits
+    service.api.last_page.return_value = len(commits)
+
+    result = get_commit_variables(service, mock_repo)
+    assert result[0][1:3] == [True, 59]
+    assert result[0][4:] == ["kequach", "2022-01-01"]
+    if not full_commit_history:
+        assert service.api.repos.list_commits.call_count == 2
+
+
 def test_get_languages(mock_repo):
     def mock_get(*args, **kwargs):
         return AttrDict(Python=1337, Shell=420)
@@ -139,6 +261,142 @@ def test_get_languages(mock_repo):
     assert result[0][1] == "Python"
 
 
+def test_retrieve_variables_keeps_input_order():
+    def mock_get(owner, repo):
+        return AttrDict(Python=len(repo))
+
+    service = MagicMock()
+    service.api.repos.list_languages = mock_get
+    repos = [Repo(f"https://github.com/kequach/{'x' * i}", "kequach", "x" * i)
+             for i in range(1, 8)]
+
+    result = retrieve_variables(service, repos, "languages", workers=3)
+    assert [entry[2] for entry in result] == list(range(1, 8))
+
+
+def test_retrieve_repo_variables_single_pass(mock_repo):
+    def mock_get(*args, **kwargs):
+        return AttrDict(url="https://api.github.com/repos/kequach/MyAnimeList-Analysis/git/trees/ef0ab1f473fea05a46ffdafdf08a4acf6ddfa6f4",
+                        tree=L(AttrDict(path="tests",
+                                        type="tree"),
+                               AttrDict(path="analysis_notebook.ipynb",
+                                        type="blob")))
+
+    service = MagicMock()
+    service.api.git.get_tree.side_effect = mock_get
+    service.tree_cache = TreeCache()
+    service.file_list = [".ipynb"]
+
+    result = retrieve_repo_variables(service, [mock_repo], ["files", "tests"])
+    assert result["files"][0][1] == "analysis_notebook.ipynb"
+    assert result["tests"][0][1] == "tests"
+    assert service.check_rate_limit.call_count == 1
+    assert service.api.git.get_tree.call_count == 1
+
+
+def test_retrieve_repo_variables_resume(tmp_path):
+    def mock_get(owner, repo):
+        return AttrDict(Python=len(repo))
+
+    service = MagicMock()
+    service.api.repos.list_languages = MagicMock(side_effect=mock_get)
+    repos = [Repo(f"https://github.com/kequach/{'x' * i}", "kequach", "x" * i)
+             for i in range(1, 5)]
+    output = str(tmp_path / "languages.csv")
+
+    export = StreamingExport(output, ["html_url_repository", "language", "num_chars"])
+    retrieve_repo_variables(service, repos[:2], ["languages"], exports={"languages": export})
+    # interrupted run: the checkpoint is kept, the run is resumed for all repositories
+    export = StreamingExport(output, ["html_url_repository", "language", "num_chars"],
+                             resume=True)
+    retrieve_repo_variables(service, repos, ["languages"], exports={"languages": export})
+    export.close("language")
+
+    assert service.api.repos.list_languages.call_count == 4
+    df_languages = pd.read_csv(output)
+    assert list(df_languages["num_chars"]) == [1, 2, 3, 4]
+    assert list(df_languages.columns) == ["html_url_repository", "language", "num_chars", "date"]
+    assert not (tmp_path / "languages.csv.checkpoint").exists()
+
+
+def test_retrieve_graphql_variables(mock_repo):
+    node = {"url": mock_repo.url, "defaultBranchRef": {"name": "main"}, "licenseInfo": None,
+            "repositoryTopics": {"nodes": [{"topic": {"name": "covid19"}}]},
+            "languages": {"edges": [{"size": 1337, "node": {"name": "Python"}},
+                                    {"size": 42, "node": {"name": "HTML"}}]},
+            "refs": {"nodes": [{"name": "v1.0"}, {"name": "v1.1"}]},
+            "readmeGithub": None,
+            "readmeRoot": {"entries": [{"name": "README.md", "type": "blob"},
+                                       {"name": "readme", "type": "tree"}]},
+            "readmeDocs": None}
+    def mock_query(path, verb, data=None):
+        if "$e0" in data["query"]:
+            assert data["variables"]["e0"] == "HEAD:README.md"
+            return {"data": {"r0": {"object": {"text": "# ASReview"}}}}
+        return {"data": {"r0": node, "r1": None}}
+
+    service = MagicMock()
+    service.api.side_effect = mock_query
+    missing_repo = Repo("https://github.com/asreview/deleted", "asreview", "deleted")
+    result = retrieve_graphql_variables(service, [mock_repo, missing_repo],
+                                        ["languages", "readmes", "versions", "topics"])
+    assert service.api.call_count == 2
+    assert result["languages"] == [[mock_repo.url, "Python", 1337], [mock_repo.url, "HTML", 42]]
+    assert result["readmes"] == [[mock_repo.url, "# ASReview"]]
+    assert result["versions"] == [[mock_repo.url, True]]
+    assert result["topics"] == [[mock_repo.url, "covid19"]]
+
+
+def test_tree_cache_disk(tmp_path):
+    tree = AttrDict(sha="ef0ab1f473fea05a46ffdafdf08a4acf6ddfa6f4",
+                    tree=L([AttrDict(path="tests", type="tree")]))
+    key = ("kequach", "MyAnimeList-Analysis", "main")
+    TreeCache(tmp_path).put(key, tree)
+
+    result = TreeCache(tmp_path).get(key)
+    assert result.tree[0].path == "tests"
+    assert TreeCache(tmp_path).get(("kequach", "MyAnimeList-Analysis", "dev")) is None
+
+
+def test_tree_cache_truncated_file(tmp_path):
+    key = ("kequach", "MyAnimeList-Analysis", "main", "2022-01-16T10:00:00Z")
+    cache = TreeCache(tmp_path)
+    cache.get_path(key).write_text('{"sha": "ef0ab1f4", "tr', encoding="utf8")
+
+    assert cache.get(key) is None
+    assert not cache.get_path(key).exists()
+    cache.put(key, AttrDict(sha="ef0ab1f4", tree=L([AttrDict(path="tests", type="tree")])))
+    assert TreeCache(tmp_path).get(key).sha == "ef0ab1f4"
+    assert [path.name for path in tmp_path.iterdir()] == [cache.get_path(key).name]
+
+
+def test_get_tree_after_push(tmp_path):
+    trees = iter([AttrDict(sha="old", tree=L([AttrDict(path="tests", type="tree")])),
+                  AttrDict(sha="new", tree=L([AttrDict(path="test", type="tree")]))])
+    service = MagicMock()
+    service.api.git.get_tree.side_effect = lambda **kwargs: next(trees)
+    service.tree_cache = TreeCache(tmp_path)
+    repo = Repo("https://github.com/kequach/HTML-Examples", "kequach", "HTML-Examples", "main",
+                "2022-01-16T10:00:00Z")
+    assert get_tree(service, repo).sha == "old"
+
+    # a later run after a push to the same branch
+    service.tree_cache = TreeCache(tmp_path)
+    repo.pushed_at = "2022-08-12T09:00:00Z"
+    assert get_tree(service, repo).sha == "new"
+    assert get_tree(service, repo).sha == "new"
+    assert service.api.git.get_tree.call_count == 2
+
+
+def test_tree_cache_eviction():
+    cache = TreeCache(max_size=100)
+    for branch in ["main", "dev", "test"]:
+        cache.put(("kequach", "HTML-Examples", branch), AttrDict(sha=branch, tree=L(["x" * 40])))
+
+    assert cache.get(("kequach", "HTML-Examples", "main")) is None
+    assert cache.get(("kequach", "HTML-Examples", "test")).sha == "test"
+
+
 def test_get_readmes(mock_repo):
     def mock_get(*args, **kwargs):
         return AttrDict(name="readme.md", content=r"""
@@ -272,3 +530,132 @@ YW4gZW1haWwgdG8gYXNyZXZpZXdAdXUubmwuCg==
 
     result = get_readmes(service, mock_repo)
     assert "[ASReview for COVID19]" in result[1]
+
+
+"""
+Tests for all_variables.py
+"""
+
+@pytest.fixture
+def df_all_repos():
+    names = ["asreview", "HTML-Examples", "deleted", "MyAnimeList-Analysis"]
+    return pd.DataFrame({"html_url": [f"https://github.com/kequach/{name}" for name in names],
+                         "owner": "kequach",
+                         "name": names,
+                         "description": None,
+                         "default_branch": "main",
+                         "topics": ["['covid19']", "[]", "[]", "[]"]})
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    """Stubs the requests of all_variables.py. The contributors of the repository
+    'deleted' can not be retrieved. The first repository is retrieved last."""
+    def mock_get_data(service, repo, variable_type, verbose=True):
+        time.sleep(0.05 if repo.repo_name == "asreview" else 0)
+        if variable_type == "contributors":
+            return None if repo.repo_name == "deleted" else [[repo.url, "kequach", 3]]
+        if variable_type == "languages":
+            return [[repo.url, "Python", len(repo.repo_name)]]
+        return [repo.url, f"# {repo.repo_name}"]
+    module = "collect_variables.scripts.all_variables"
+    monkeypatch.setattr(f"{module}.get_data_from_api", mock_get_data)
+    monkeypatch.setattr(f"{module}.parse_repo",
+                        lambda url: [url, True, url.endswith("asreview"), False, False, False])
+    service = MagicMock()
+    service.current_date = "2022-08-12"
+    return service
+
+
+def test_get_repo_data_concurrent(df_all_repos, mock_api):
+    sequential = [get_repo_data(mock_api, row) for _, row in df_all_repos.iterrows()]
+    concurrent = [get_repo_data(mock_api, row, concurrent=True)
+                  for _, row in df_all_repos.iterrows()]
+    # a repository whose contributors can not be retrieved is skipped in both modes
+    assert sequential[2] is None and concurrent[2] is None
+    assert concurrent == sequential
+    assert list(concurrent[0]) == ["url", "owner", "repository_name",
+                                   "date_all_variable_collection", "description",
+                                   "contributors", "howfairis", "topics", "languages", "readme"]
+    assert concurrent[0]["howfairis"]["howfairis_license"] is True
+    assert concurrent[0]["topics"] == ["covid19"]
+
+
+def test_get_repo_lines_order(df_all_repos, mock_api):
+    unchanged_records = {df_all_repos["html_url"][3]: '{"url": "unchanged"}\n'}
+    lines = list(get_repo_lines(mock_api, df_all_repos, unchanged_records, workers=4,
+                                concurrent=True))
+    assert lines[2] is None
+    assert lines[3] == '{"url": "unchanged"}\n'
+    assert [json.loads(line)["url"] for line in lines[:2]] == list(df_all_repos["html_url"][:2])
+
+
+@pytest.fixture
+def collected_tables(df_all_repos):
+    """Tables as retrieved by github.py and howfairis_variables.py for the repositories
+    of mock_api. The repository 'deleted' has no contributors."""
+    urls = df_all_repos["html_url"].drop(2)
+    names = df_all_repos["name"].drop(2)
+    return {
+        "df_contributors": pd.DataFrame({"html_url_repository": urls, "login": "kequach",
+                                         "contributions": 3}),
+        "df_languages": pd.DataFrame({"html_url_repository": urls, "language": "Python",
+                                      "num_chars": names.str.len()}),
+        "df_readmes": pd.DataFrame({"html_url_repository": urls, "readme": "# " + names}),
+        "df_howfairis": pd.DataFrame({"html_url": urls,
+                                      "howfairis_repository": True,
+                                      "howfairis_license": urls.str.endswith("asreview"),
+                                      "howfairis_registry": False,
+                                      "howfairis_citation": False,
+                                      "howfairis_checklist": False}),
+    }
+
+
+def test_group_records():
+    df_languages = pd.DataFrame({"html_url_repository": ["a", "b", "a"],
+                                 "language": ["Python", "R", "HTML"],
+                                 "num_chars": [1337, 7, 42]})
+    result = group_records(df_languages, ["language", "num_chars"])
+    assert result == {"a": [{"language": "Python", "num_chars": 1337},
+                            {"language": "HTML", "num_chars": 42}],
+                      "b": [{"language": "R", "num_chars": 7}]}
+    assert isinstance(result["a"][0]["num_chars"], int)
+
+
+def test_assemble_repo_data(df_all_repos, mock_api, collected_tables):
+    retrieved = [get_repo_data(mock_api, row) for _, row in df_all_repos.iterrows()]
+    assembled = list(assemble_repo_data(df_all_repos, current_date="2022-08-12",
+                                        **collected_tables))
+    # the same documents as retrieved from the API, also without the repository 'deleted'
+    assert assembled == [document for document in retrieved if document is not None]
+    assert json.loads(simplejson.dumps(assembled[0], ignore_nan=True)) == assembled[0]
+
+
+def test_assemble_repo_data_missing(df_all_repos, collected_tables):
+    collected_tables["df_languages"] = collected_tables["df_languages"].iloc[:0]
+    collected_tables["df_readmes"] = collected_tables["df_readmes"].iloc[:0]
+    collected_tables["df_howfairis"] = collected_tables["df_howfairis"].iloc[:0]
+    assembled = list(assemble_repo_data(df_all_repos, current_date="2022-08-12",
+                                        **collected_tables))
+    assert len(assembled) == 3
+    assert assembled[0]["languages"] == [] and assembled[0]["howfairis"] == {}
+    assert "readme" not in assembled[0]
+    assert assembled[0]["contributors"] == [{"contributor": "kequach", "contributions": 3}]
+
+
+def test_write_repo_lines_interrupted(tmp_path):
+    output = tmp_path / "all_variables.json"
+    output.write_text('{"url": "a"}\n{"url": "b"}\n', encoding="utf8")
+    def interrupted_lines():
+        yield '{"url": "a"}\n'
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        write_repo_lines(interrupted_lines(), output, 2, replace=True)
+    # the previous output is kept, including the records that were not rewritten yet
+    assert output.read_text(encoding="utf8") == '{"url": "a"}\n{"url": "b"}\n'
+    assert list(tmp_path.iterdir()) == [output]
+
+    write_repo_lines(['{"url": "a"}\n', None, '{"url": "c"}\n'], output, 3, replace=True)
+    assert output.read_text(encoding="utf8") == '{"url": "a"}\n{"url": "c"}\n'
+    assert list(tmp_path.iterdir()) == [output]